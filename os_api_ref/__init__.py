@@ -11,10 +11,15 @@
 # under the License.
 
 from collections.abc import Iterable
+from collections.abc import Iterator
 from collections import OrderedDict
+import filecmp
+import functools
 import hashlib
+import json
 import os
 import re
+import shutil
 from typing import Any
 
 from docutils import nodes
@@ -24,16 +29,33 @@ from docutils.parsers.rst.states import Body
 from docutils.statemachine import StringList
 import pbr.version
 from sphinx.application import Sphinx
+from sphinx.builders.html import StandaloneHTMLBuilder
+from sphinx.environment import BuildEnvironment
+from sphinx.environment.adapters.toctree import document_toc
 from sphinx.util import logging
-from sphinx.util.osutil import copyfile
+from sphinx.util.osutil import relative_uri
 from sphinx.writers.html5 import HTML5Translator
 from sphinx.writers.text import TextTranslator
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore[assignment]
+
+from os_api_ref import bundle
+from os_api_ref import export
+from os_api_ref import model
+from os_api_ref import parse_cache
+from os_api_ref import profile
+from os_api_ref import search
+from os_api_ref import yaml_cache
 from os_api_ref.http_codes import http_code
 from os_api_ref.http_codes import http_code_html
 from os_api_ref.http_codes import http_code_text
 from os_api_ref.http_codes import HTTPResponseCodeDirective
+from os_api_ref.http_codes import load_status_file
+from os_api_ref.http_codes import merge_extra_codes
 
 __version__ = pbr.version.VersionInfo('os_api_ref').version_string()
 
@@ -71,34 +93,42 @@ in both naming and ordering of parameters at every declaration.
 """
 
 
-def ordered_load(stream: Any) -> OrderedDict[str, Any]:
-    """Load yaml as an ordered dict
+class OrderedLoader(SafeLoader):
+    """Safe yaml loader which keeps the order of mappings.
 
-    This allows us to inspect the order of the file on disk to make
-    sure it was correct by our rules.
+    This uses the libyaml based parser when it is available, which is
+    an order of magnitude faster on large parameters files.
     """
 
-    class OrderedLoader(yaml.SafeLoader):
-        pass
+    pass
 
-    def construct_mapping(
-        loader: OrderedLoader, node: yaml.MappingNode
-    ) -> OrderedDict[str, Any]:
-        loader.flatten_mapping(node)
-        pairs = loader.construct_pairs(node)  # type: ignore[no-untyped-call]
-        return OrderedDict(pairs)
 
-    OrderedLoader.add_constructor(
-        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping
-    )
-    # for parameters.yaml we treat numbers (especially version
-    # numbers) as strings. So that microversion specification of 2.20
-    # and 2.2 don't get confused.
-    OrderedLoader.add_constructor(  # type: ignore[type-var]
-        'tag:yaml.org,2002:float',
-        yaml.constructor.SafeConstructor.construct_yaml_str,
-    )
+def _construct_mapping(
+    loader: OrderedLoader, node: yaml.MappingNode
+) -> OrderedDict[str, Any]:
+    loader.flatten_mapping(node)
+    pairs = loader.construct_pairs(node)  # type: ignore[no-untyped-call]
+    return OrderedDict(pairs)
+
+
+OrderedLoader.add_constructor(
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _construct_mapping
+)
+# for parameters.yaml we treat numbers (especially version
+# numbers) as strings. So that microversion specification of 2.20
+# and 2.2 don't get confused.
+OrderedLoader.add_constructor(  # type: ignore[type-var]
+    'tag:yaml.org,2002:float',
+    yaml.constructor.SafeConstructor.construct_yaml_str,
+)
+
+
+def ordered_load(stream: Any) -> OrderedDict[str, Any]:
+    """Load yaml as an ordered dict
 
+    This allows us to inspect the order of the file on disk to make
+    sure it was correct by our rules.
+    """
     result: OrderedDict[str, Any] = yaml.load(stream, OrderedLoader)
     return result
 
@@ -162,6 +192,10 @@ class RestExpandAllDirective(rst.Directive):
         return [node]
 
 
+# A path parameter in a rest_method url, e.g. {server_id}
+PATH_PARAM_RE = re.compile("{([a-zA-Z][a-zA-Z_0-9]*)}")
+
+
 class RestMethodDirective(rst.Directive):
     # this enables content in the directive
     has_content = True
@@ -189,11 +223,6 @@ class RestMethodDirective(rst.Directive):
         node['method'] = method
         node['url'] = url
 
-        # Extract the path parameters from the url
-        env = self.state.document.settings.env
-        env.path_params = []
-        env.path_params = re.findall("{[a-zA-Z][a-zA-Z_0-9]*}", url)
-
         node['target'] = self.state.parent.attributes['ids'][0]
         node['css_classes'] = ""
         if node['min_version']:
@@ -215,121 +244,245 @@ class RestMethodDirective(rst.Directive):
         target = nodes.target(ids=[temp_target])
         assert isinstance(self.state, Body)
         self.state.add_target(temp_target, '', target, lineno)
+
+        # The names of the path parameters in the url, which the
+        # rest_parameters stanzas of this method check off. This is
+        # set after the hash above so it doesn't change the targets.
+        node['path_params'] = list(dict.fromkeys(PATH_PARAM_RE.findall(url)))
+
+        title = self.state.parent.next_node(nodes.title)
+        env = self.state.document.settings.env
+        model.add_method(env, node, title.astext() if title else '')
+
         section += node
 
         return [target, section]
 
 
-# cache for file -> yaml so we only do the load and check of a yaml
-# file once during a sphinx processing run.
-YAML_CACHE: dict[str, OrderedDict[str, Any]] = {}
+def find_rest_method(node: nodes.Element | None) -> rest_method | None:
+    """Find the rest_method a stanza at node belongs to.
 
+    That is the last rest_method declared in the closest enclosing
+    section which has one.
+    """
+    method = model.find_method_node(node)
+    return method if isinstance(method, rest_method) else None
 
-class RestParametersDirective(Table):
-    headers = ["Name", "In", "Type", "Description"]
-    yaml: list[tuple[str, dict[str, Any]]]
-    yaml_file: str
-    col_widths: list[int]
-    max_cols: int
 
-    def _load_param_file(self, fpath: str) -> OrderedDict[str, Any] | None:
-        global YAML_CACHE
-        if fpath in YAML_CACHE:
-            return YAML_CACHE[fpath]
+# cache for file -> (mtime, yaml) so we only do the load and check of
+# a yaml file once during a sphinx processing run, or again when the
+# file changed on disk (e.g. with sphinx-autobuild). An empty file is
+# kept as None, so it is only reported once too.
+YAML_CACHE: dict[str, tuple[int | None, OrderedDict[str, Any] | None]] = {}
+
+
+@profile.timed('load_param_file')
+def load_param_file(
+    env: BuildEnvironment, fpath: str, docname: str
+) -> OrderedDict[str, Any] | None:
+    """Load, check and cache the parameters file at fpath.
 
-        lookup: OrderedDict[str, Any] | None = None
+    docname is the document referencing the file, it is only used as
+    the location of the warnings we emit.
+    """
+    global YAML_CACHE
+    mtime = yaml_cache.mtime(fpath)
+    if fpath in YAML_CACHE:
+        cached_mtime, cached_lookup = YAML_CACHE[fpath]
+        if cached_mtime == mtime:
+            profile.count('yaml_cache.memory_hit')
+            return cached_lookup
+        del YAML_CACHE[fpath]
+
+    lookup: OrderedDict[str, Any] | None = None
+    try:
+        with open(fpath, 'rb') as stream:
+            content = stream.read()
+    except OSError:
+        LOG.warning(
+            "Parameters file not found, %s",
+            fpath,
+            location=(docname, None),
+        )
+        return None
+
+    # The parsed file and its sorting warnings are kept in the
+    # doctree dir, so that only the first build after a change
+    # of the file pays for the parse.
+    cache_dir = str(env.doctreedir)
+    cached = yaml_cache.load(cache_dir, fpath, content)
+    if cached is not None:
+        profile.count('yaml_cache.disk_hit')
+        lookup, warnings = cached
+    else:
+        profile.count('yaml_cache.miss')
         try:
-            with open(fpath) as stream:
-                lookup = ordered_load(stream)
-        except OSError:
-            LOG.warning(
-                "Parameters file not found, %s",
-                fpath,
-                location=(self.env.docname, None),
-            )
-            return None
+            lookup = ordered_load(content)
         except yaml.YAMLError:
             LOG.exception(
                 "Error while parsing file [%s].",
                 fpath,
-                location=(self.env.docname, None),
+                location=(docname, None),
             )
             raise
-
+        warnings = []
         if lookup:
-            self._check_yaml_sorting(fpath, lookup)
-        else:
-            LOG.warning(
-                "Parameters file is empty, %s",
-                fpath,
-                location=(self.env.docname, None),
-            )
-            return None
+            warnings = _check_yaml_sorting(fpath, lookup)
+        yaml_cache.store(cache_dir, fpath, content, lookup, warnings)
 
-        YAML_CACHE[fpath] = lookup
-        return lookup
+    for msg, args in warnings:
+        LOG.warning(msg, *args)
 
-    def _check_yaml_sorting(
-        self, fpath: str, yaml_data: OrderedDict[str, Any]
-    ) -> None:
-        """check yaml sorting
-
-        Assuming we got an ordered dict, we iterate through it
-        basically doing a gnome sort test
-        (https://en.wikipedia.org/wiki/Gnome_sort) and ensure the item
-        we are looking at is > the last item we saw. This is done at
-        the section level first, so we're grouped, then alphabetically
-        by lower case name within a section. Every time there is a
-        mismatch we raise an warn message.
-        """
-        sections = {"header": 1, "path": 2, "query": 3, "body": 4}
-
-        last = None
-        for key, value in yaml_data.items():
-            if not isinstance(value, dict):
-                raise Exception(
-                    f'Expected a dict for {key}; got {key}={value}).\n'
-                    'You probably have indentation typo in your'
-                    'YAML source'
-                )
+    if not lookup:
+        LOG.warning(
+            "Parameters file is empty, %s",
+            fpath,
+            location=(docname, None),
+        )
+        lookup = None
+
+    YAML_CACHE[fpath] = (mtime, lookup)
+    return lookup
+
+
+@profile.timed('_check_yaml_sorting')
+def _check_yaml_sorting(
+    fpath: str, yaml_data: OrderedDict[str, Any]
+) -> list[yaml_cache.CachedWarning]:
+    """check yaml sorting
+
+    Assuming we got an ordered dict, we iterate through it
+    basically doing a gnome sort test
+    (https://en.wikipedia.org/wiki/Gnome_sort) and ensure the item
+    we are looking at is > the last item we saw. This is done at
+    the section level first, so we're grouped, then alphabetically
+    by lower case name within a section. Every time there is a
+    mismatch we record a warning message, which is returned so
+    the caller can emit it (and replay it on a cached load).
+    """
+    sections = {"header": 1, "path": 2, "query": 3, "body": 4}
+
+    warnings: list[yaml_cache.CachedWarning] = []
+    last = None
+    for key, value in yaml_data.items():
+        if not isinstance(value, dict):
+            raise Exception(
+                f'Expected a dict for {key}; got {key}={value}).\n'
+                'You probably have indentation typo in your'
+                'YAML source'
+            )
 
-            # use of an invalid 'in' value
-            if value['in'] not in sections:
-                LOG.warning(
+        # use of an invalid 'in' value
+        if value['in'] not in sections:
+            warnings.append(
+                (
                     "``%s`` is not a valid value for 'in' (must be "
                     "one of: %s). (see ``%s``)",
-                    value['in'],
-                    ", ".join(sorted(sections.keys())),
-                    key,
+                    (
+                        value['in'],
+                        ", ".join(sorted(sections.keys())),
+                        key,
+                    ),
                 )
-                continue
+            )
+            continue
 
-            if last is None:
-                last = (key, value)
-                continue
-            # ensure that sections only go up
-            current_section = value['in']
-            last_section = last[1]['in']
-            if sections[current_section] < sections[last_section]:
-                LOG.warning(
+        if last is None:
+            last = (key, value)
+            continue
+        # ensure that sections only go up
+        current_section = value['in']
+        last_section = last[1]['in']
+        if sections[current_section] < sections[last_section]:
+            warnings.append(
+                (
                     "Section out of order. All parameters in section "
                     "``%s`` should be after section ``%s``. (see "
                     "``%s``)",
-                    last_section,
-                    current_section,
-                    last[0],
+                    (last_section, current_section, last[0]),
                 )
-            if (
-                sections[value['in']] == sections[last[1]['in']]
-                and key.lower() < last[0].lower()
-            ):
-                LOG.warning(
+            )
+        if (
+            sections[value['in']] == sections[last[1]['in']]
+            and key.lower() < last[0].lower()
+        ):
+            warnings.append(
+                (
                     "Parameters out of order ``%s`` should be after ``%s``",
-                    last[0],
-                    key,
+                    (last[0], key),
                 )
-            last = (key, value)
+            )
+        last = (key, value)
+    return warnings
+
+
+# Characters a yaml plain scalar can't start with.
+YAML_INDICATORS = frozenset('-?:,[]{}#&*!|>\'"%@`')
+
+_YAML_RESOLVER = yaml.resolver.Resolver()
+
+
+def _is_plain_str(value: str) -> bool:
+    """Whether yaml would load value, unquoted, as this same string."""
+    return (
+        bool(value)
+        and value[0] not in YAML_INDICATORS
+        and value[-1] != ':'
+        and value == value.strip()
+        and ': ' not in value
+        and ' #' not in value
+        and '\t' not in value
+        and _YAML_RESOLVER.resolve(  # type: ignore[no-untyped-call]
+            yaml.ScalarNode, value, (True, False)
+        )
+        == 'tag:yaml.org,2002:str'
+    )
 
+
+def parse_param_list(content: Iterable[str]) -> Any:
+    """Parse the body of a rest_parameters stanza.
+
+    Stanzas are nearly always a flat list of ``- name: reference``
+    lines, which we parse directly. Anything else goes through the
+    yaml parser, so the result (and the warnings for invalid
+    definitions) is the same as a ``yaml.safe_load`` of the body.
+    """
+    content = list(content)
+    parsed = []
+    for line in content:
+        if not line.strip() or line.startswith('#'):
+            continue
+        if not line.startswith('- '):
+            break
+        name, sep, ref = line[2:].partition(': ')
+        ref = ref.rstrip(' ')
+        if not sep or not _is_plain_str(name) or not _is_plain_str(ref):
+            break
+        parsed.append({name: ref})
+    else:
+        if parsed:
+            return parsed
+    return yaml.safe_load("\n".join(content))
+
+
+# Cell values which the rst parser would turn into a single paragraph
+# of plain text, like most parameter names and every 'in' and 'type'.
+PLAIN_CELL_RE = re.compile(
+    r'[A-Za-z](?:[\w-]*[A-Za-z0-9-])?(?: \(Optional\))?'
+)
+
+
+class RestParametersDirective(Table):
+    headers = ["Name", "In", "Type", "Description"]
+    yaml: list[tuple[str, str, dict[str, Any]]]
+    yaml_file: str
+    col_widths: list[int]
+    max_cols: int
+
+    def _load_param_file(self, fpath: str) -> OrderedDict[str, Any] | None:
+        return load_param_file(self.env, fpath, self.env.docname)
+
+    @profile.timed('rest_parameters.yaml_from_file')
     def yaml_from_file(self, fpath: str) -> None:
         """Collect Parameter stanzas from inline + file.
 
@@ -341,9 +494,9 @@ class RestParametersDirective(Table):
         if not lookup:
             return
 
-        content = "\n".join(self.content)
-        parsed = yaml.safe_load(content)
-        new_content: list[tuple[str, dict[str, Any]]] = list()
+        parsed = parse_param_list(self.content)
+        new_content: list[tuple[str, str, dict[str, Any]]] = list()
+        names = set()
         node = self.state_machine.node
         for paramlist in parsed:
             if not isinstance(paramlist, dict):
@@ -360,7 +513,7 @@ class RestParametersDirective(Table):
                 continue
             for name, ref in paramlist.items():
                 if ref in lookup:
-                    new_content.append((name, lookup[ref]))
+                    new_content.append((name, ref, lookup[ref]))
                 else:
                     # TODO(sdague): this provides a kind of confusing
                     # error message because app.warn isn't meant to be
@@ -377,19 +530,18 @@ class RestParametersDirective(Table):
                         ref,
                         fpath,
                     )
-
-                # Check for path params in stanza
-                for i, param in enumerate(self.env.path_params):
-                    if param.rstrip('}').lstrip('{') == name:
-                        del self.env.path_params[i]
-                        break
-                    else:
-                        continue
-
-        if len(self.env.path_params) != 0:
+                names.add(name)
+
+        # Check off the path params of our method found in the stanza,
+        # the ones left are expected in a later stanza.
+        method = find_rest_method(self.state.parent)
+        if method is not None and method['path_params']:
+            method['path_params'] = [
+                param for param in method['path_params'] if param not in names
+            ]
             # Warn that path parameters are not set in rest_parameter
             # stanza and will not appear in the generated table.
-            for param in self.env.path_params:
+            for param in method['path_params']:
                 location = (
                     node.source if node else None,
                     node.line if node else None,
@@ -397,10 +549,11 @@ class RestParametersDirective(Table):
                 LOG.warning(
                     "No path parameter ``%s`` found in rest_parameter"
                     " stanza.\n",
-                    param.rstrip('}').lstrip('{'),
+                    param,
                 )
 
         self.yaml = new_content
+        model.add_parameters(self.env, self.state.parent, new_content)
 
     def run(self) -> list[nodes.Node]:
         self.env = self.state.document.settings.env
@@ -426,6 +579,8 @@ class RestParametersDirective(Table):
         # NOTE(sdague): it's important that we pop the arg otherwise
         # we end up putting the filename as the table caption.
         rel_fpath, fpath = self.env.relfn2path(self.arguments.pop())
+        # Rebuild this document when the parameters file changes.
+        self.env.note_dependency(fpath)
         self.yaml_file = fpath
         self.yaml_from_file(self.yaml_file)
 
@@ -472,9 +627,28 @@ class RestParametersDirective(Table):
     def add_col(self, value: str) -> nodes.entry:
         entry = nodes.entry()
         result = StringList(value.split('\n'))
+        if PLAIN_CELL_RE.fullmatch(value):
+            # Names, and the 'in' and 'type' values, are nearly always
+            # a single plain word, which doesn't need the rst parser.
+            entry += nodes.paragraph(value, value)
+            return entry
         self.state.nested_parse(result, 0, entry)
         return entry
 
+    def add_desc_col(
+        self, ref: str, min_version: str, max_version: str, value: str
+    ) -> nodes.entry:
+        # The same description is rendered in many tables, so reuse
+        # the parsed result for a given parameter definition.
+        key = ('parameter', self.yaml_file, ref, min_version, max_version)
+        entry = parse_cache.get(
+            key, *self.state_machine.get_source_and_line(self.lineno)
+        )
+        if entry is None:
+            entry = self.add_col(value)
+            parse_cache.store(key, entry)
+        return entry
+
     def show_no_yaml_error(self) -> nodes.row:
         trow = nodes.row(classes=["no_yaml"])
         trow += self.add_col(f"No yaml found {self.yaml_file}")
@@ -483,11 +657,12 @@ class RestParametersDirective(Table):
         trow += self.add_col("")
         return trow
 
+    @profile.timed('rest_parameters.collect_rows')
     def collect_rows(self) -> tuple[list[nodes.row], list[nodes.tgroup]]:
         rows: list[nodes.row] = []
         groups: list[nodes.tgroup] = []
         try:
-            for key, values in self.yaml:
+            for key, ref, values in self.yaml:
                 min_version = values.get('min_version', '')
                 max_version = values.get('max_version', '')
                 desc = values.get('description', '')
@@ -505,6 +680,9 @@ class RestParametersDirective(Table):
                     ).replace('.', '_')
                     classes.append(max_ver_css_name)
                 trow = nodes.row(classes=classes)
+                if min_version or max_version:
+                    trow['min_version'] = str(min_version) or None
+                    trow['max_version'] = str(max_version) or None
                 name = key
                 if values.get('required', False) is False:
                     name += " (Optional)"
@@ -515,7 +693,7 @@ class RestParametersDirective(Table):
                 # as a warning, which is the desired behavior.
                 trow += self.add_col(values.get('in'))  # type: ignore[arg-type]
                 trow += self.add_col(values.get('type'))  # type: ignore[arg-type]
-                trow += self.add_col(desc)
+                trow += self.add_desc_col(ref, min_version, max_version, desc)
                 rows.append(trow)
         except AttributeError as exc:
             if 'key' in locals():
@@ -559,9 +737,8 @@ class RestParametersDirective(Table):
         return table
 
 
-def rest_method_html(self: HTML5Translator, node: rest_method) -> None:
-    tmpl = """
-<div class="operation-grp %(css_classes)s container">
+REST_METHOD_TMPL = """
+<div class="operation-grp %(css_classes)s container" id="%(target)s-operation">
 <div class="row">
     <div class="col-md-2">
     <div class="operation">
@@ -587,24 +764,66 @@ def rest_method_html(self: HTML5Translator, node: rest_method) -> None:
        class="btn btn-info btn-sm btn-detail"
        data-bs-target="#%(target)s-detail"
        data-bs-toggle="collapse"
+       data-ordinal="%(ordinal)s"
        id="%(target)s-detail-btn"
        >detail</button>
     </div>
 </div>
 </div>"""
 
-    node['url'] = node['url'].replace('{', '<span class="path_parameter">{')
-    node['url'] = node['url'].replace('}', '}</span>')
 
-    self.body.append(tmpl % node)
+@functools.lru_cache(maxsize=8192)
+def render_rest_method(
+    method: str,
+    url: str,
+    target: str,
+    css_classes: str,
+    desc: str,
+    ordinal: int | str,
+) -> str:
+    """Return the html of a rest_method, the same for the same node."""
+    url = url.replace('{', '<span class="path_parameter">{')
+    url = url.replace('}', '}</span>')
+    return REST_METHOD_TMPL % {
+        'method': method,
+        'url': url,
+        'target': target,
+        'css_classes': css_classes,
+        'desc': desc,
+        'ordinal': ordinal,
+    }
+
+
+def rest_method_html(self: HTML5Translator, node: rest_method) -> None:
+    self.body.append(
+        render_rest_method(
+            node['method'],
+            node['url'],
+            node['target'],
+            node['css_classes'],
+            str(node['desc']),
+            node.get('ordinal', ''),
+        )
+    )
     raise nodes.SkipNode
 
 
+SEARCH_BOX = """
+<div class="col-md-4 api-search">
+    <input type="search" id="api-search"
+       class="form-control input-sm form-control-sm"
+       placeholder="Search methods" autocomplete="off"
+       aria-label="Search methods"
+       data-root="%(search_root)s" data-page="%(search_page)s">
+    <div id="api-search-results" class="list-group"></div>
+</div>"""
+
+
 def rest_expand_all_html(self: HTML5Translator, node: rest_expand_all) -> None:
     tmpl = """
 <div class="row">
-%(extra_js)s
-<div class="col-md-2 col-md-offset-9 ms-auto">
+%(extra_js)s%(search)s
+<div class="col-md-2 col-md-offset-5 ms-auto">
 %(selector)s
 </div>
 <div class=col-md-1>
@@ -618,8 +837,20 @@ def rest_expand_all_html(self: HTML5Translator, node: rest_expand_all) -> None:
     node.setdefault('selector', "")
     node.setdefault('extra_js', "")
 
+    # Only some builders write the search index. It and the pages it
+    # links to are found from the root of the site.
+    node['search'] = ''
+    if self.builder.name in search.BUILDERS:
+        page = self.builder.get_target_uri(self.builder.current_docname)
+        node['search'] = SEARCH_BOX % {
+            'search_root': relative_uri(page, ''),
+            'search_page': page,
+        }
+
     if node['major']:
         node['selector'], node['extra_js'] = create_mv_selector(node)
+        if node.get('mv_index'):
+            node['extra_js'] += mv_index_html(node['mv_index'])
 
     self.body.append(tmpl % node)
     raise nodes.SkipNode
@@ -634,10 +865,31 @@ def rest_expand_all_text(self: TextTranslator, node: rest_expand_all) -> None:
 
 
 def create_mv_selector(node: rest_expand_all) -> tuple[str, str]:
-    mv_list = '<option value="" selected="selected">All</option>'
-
-    for x in range(node['min_ver'], node['max_ver'] + 1):
-        mv_list += build_mv_item(node['major'], x, node['releases'])
+    # The microversions rendered as pages of their own, by version.
+    pages: dict[str, str] = dict(node.get('mv_pages', ()))
+    current = node.get('mv_version')
+
+    if current:
+        # A page rendered for a single microversion only links to the
+        # complete page and to the other rendered microversions.
+        mv_list = '<option value="" data-href="{}">All</option>'.format(
+            node['mv_all_uri']
+        )
+        versions = [parse_version(version) for version in pages]
+    else:
+        mv_list = '<option value="" selected="selected">All</option>'
+        versions = [
+            (node['major'], x)
+            for x in range(node['min_ver'], node['max_ver'] + 1)
+        ]
+
+    releases = node['releases'] or {}
+    mv_list += mv_options(
+        tuple(filter(None, versions)),
+        tuple(sorted(releases.items())),
+        tuple(pages.items()),
+        current,
+    )
 
     selector_tmpl = """
 <form class=form-inline">
@@ -666,45 +918,455 @@ Microversions
     return selector_tmpl % selector_content, js_tmpl % js_content
 
 
-def build_mv_item(major: int, micro: int, releases: dict[str, str]) -> str:
+def mv_index_html(index: dict[str, list[str | None]]) -> str:
+    # "</" can't appear in a script element, json escapes are fine
+    # with "<\/".
+    data = json.dumps(index, separators=(',', ':')).replace('</', '<\\/')
+    return f'<script type="application/json" id="mv-index">{data}</script>\n'
+
+
+@functools.cache
+def mv_options(
+    versions: tuple[tuple[int, int], ...],
+    releases: tuple[tuple[str, str], ...],
+    pages: tuple[tuple[str, str], ...],
+    current: str | None,
+) -> str:
+    """Return the selector options of versions.
+
+    All the pages of a build get the same options, so they are only
+    built once.
+    """
+    release_names = dict(releases)
+    page_uris = dict(pages)
+    options = []
+    for major, micro in versions:
+        version = f'{major}.{micro}'
+        options.append(
+            build_mv_item(
+                major,
+                micro,
+                release_names,
+                href=page_uris.get(version),
+                selected=version == current,
+            )
+        )
+    return ''.join(options)
+
+
+def build_mv_item(
+    major: int,
+    micro: int,
+    releases: dict[str, str],
+    href: str | None = None,
+    selected: bool = False,
+) -> str:
     version = f'{major}.{micro}'
+    attrs = f'value="{version}"'
+    if href:
+        attrs += f' data-href="{href}"'
+    if selected:
+        attrs += ' selected="selected"'
     if version in releases:
-        return f'<option value="{version}">{version} - {releases[version].capitalize()}</option>'  # noqa: E501
+        return f'<option {attrs}>{version} - {releases[version].capitalize()}</option>'  # noqa: E501
     else:
-        return f'<option value="{version}">{version}</option>'
+        return f'<option {attrs}>{version}</option>'
 
 
+@profile.timed('resolve_rest_references')
 def resolve_rest_references(app: Sphinx, doctree: nodes.document) -> None:
-    for node in list(doctree.findall()):
+    # The rest_method sections to move, grouped by the grand parent
+    # they move into, then by the section they are moved in front of.
+    # Nodes compare by identity, so they are keyed by id().
+    moves: dict[int, tuple[nodes.Element, dict[int, list[nodes.Node]]]] = {}
+
+    for ordinal, rest_node in enumerate(list(doctree.findall(rest_method))):
+        # The position of the method in the page, the page state in
+        # the url refers to the expanded sections by it.
+        rest_node['ordinal'] = ordinal
+
+        rest_method_section = rest_node.parent
+        rest_section = rest_method_section.parent
+        gp = rest_section.parent
+
+        # Added required classes to the top section
+        rest_section.attributes['classes'].append('api-detail')
+        rest_section.attributes['classes'].append('collapse')
+
+        # Pop the title off the collapsed section
+        title = rest_section.children.pop(0)
+        rest_node['desc'] = title.children[0]
+
+        # In order to get the links in the sidebar to be right, we
+        # have to do some id flipping here late in the game. The
+        # rest_method_section has basically had a dummy id up
+        # until this point just to keep it from colliding with
+        # it's parent.
+        rest_section.attributes['ids'][0] = "{}-detail".format(
+            rest_section.attributes['ids'][0]
+        )
+        rest_method_section.attributes['ids'][0] = rest_node['target']
+
+        rest_section.remove(rest_method_section)
+        _, before = moves.setdefault(id(gp), (gp, {}))
+        before.setdefault(id(rest_section), []).append(rest_method_section)
+
+    # Pop the overall sections into their grand parent, right before
+    # where their current parent lives. Each grand parent is rebuilt
+    # once, as looking up and inserting at the index of every section
+    # is quadratic on pages with a lot of methods.
+    for gp, before in moves.values():
+        children: list[nodes.Node] = []
+        for child in gp.children:
+            children.extend(before.get(id(child), ()))
+            children.append(child)
+        gp[:] = children
+
+
+def mv_elements(
+    doctree: nodes.document,
+) -> Iterator[tuple[str, nodes.Element]]:
+    """Yield the methods and parameter rows with a microversion range.
+
+    Each comes with the id of the html element showing it, parameter
+    rows are given one if needed.
+    """
+    counter = 0
+    for node in doctree.findall(nodes.Element):
+        if not (node.get('min_version') or node.get('max_version')):
+            continue
+        if isinstance(node, rest_method):
+            yield f"{node['target']}-operation", node
+        elif isinstance(node, nodes.row):
+            if not node['ids']:
+                while f'mv-{counter}' in doctree.ids:
+                    counter += 1
+                node['ids'].append(f'mv-{counter}')
+                counter += 1
+            yield node['ids'][0], node
+
+
+def build_mv_index(app: Sphinx, doctree: nodes.document, docname: str) -> None:
+    """Give the microversion selectors the ranges of the page elements.
+
+    The index maps the html id of every method and parameter row with
+    a microversion range to its [min_version, max_version], so the
+    page doesn't need to look for them when a version is selected.
+    """
+    if app.builder.format != 'html':
+        return
+    selectors = [
+        node for node in doctree.findall(rest_expand_all) if node['major']
+    ]
+    if not selectors:
+        return
+    index = {
+        elem_id: [node.get('min_version'), node.get('max_version')]
+        for elem_id, node in mv_elements(doctree)
+    }
+    pages = microversion_pages(app, docname)
+    if pages:
+        MV_PAGE_DOCNAMES.add(docname)
+    for node in selectors:
+        node['mv_index'] = index
+        node['mv_pages'] = [
+            (version, app.builder.get_relative_uri(docname, pagename))
+            for version, pagename in pages
+        ]
+
+
+def add_lazy_details(
+    app: Sphinx, doctree: nodes.document, docname: str
+) -> None:
+    """Wrap the content of every details section in a <template>.
+
+    The browser doesn't build the DOM of the templates, api-site.js
+    renders them when their section is first shown.
+    """
+    if app.builder.format != 'html' or not app.config.os_api_ref_lazy_details:
+        return
+    for section in list(doctree.findall(nodes.section)):
+        if 'api-detail' in section['classes']:
+            section.insert(
+                0,
+                nodes.raw(
+                    '', '<template class="api-detail-lazy">', format='html'
+                ),
+            )
+            section.append(nodes.raw('', '</template>', format='html'))
+
+
+def parse_version(version: str | None) -> tuple[int, int] | None:
+    """Return a microversion as a (major, micro) tuple, if it is one."""
+    try:
+        major, micro = str(version).split('.')
+        return int(major), int(micro)
+    except ValueError:
+        return None
+
+
+def in_mv_range(node: nodes.Element, version: tuple[int, int]) -> bool:
+    min_version = parse_version(node.get('min_version'))
+    max_version = parse_version(node.get('max_version'))
+    return (min_version is None or min_version <= version) and (
+        max_version is None or version <= max_version
+    )
+
+
+# The documents written in this build which have microversion pages
+# to render, and a copy of their resolved doctrees. They are reset at
+# the start of every build, in case the last one in this process
+# stopped before rendering the pages.
+MV_PAGE_DOCNAMES: set[str] = set()
+MV_DOCTREES: dict[str, nodes.document] = {}
+
+
+def microversion_pages(app: Sphinx, docname: str) -> list[tuple[str, str]]:
+    """Return the (version, pagename) rendered for a microversion.
+
+    'latest' stands for os_api_ref_max_microversion. Pages are only
+    rendered by the builders writing one html file per document.
+    """
+    if app.builder.name not in ('html', 'readthedocs'):
+        return []
+    pages: dict[str, str] = {}
+    for label in app.config.os_api_ref_render_microversions:
+        if label == 'latest':
+            version = parse_version(app.config.os_api_ref_max_microversion)
+        else:
+            version = parse_version(label)
+        if version is not None:
+            pages.setdefault(
+                f'{version[0]}.{version[1]}', f'{docname}.{label}'
+            )
+    return list(pages.items())
+
+
+def filter_microversion(
+    doctree: nodes.document, version: tuple[int, int]
+) -> None:
+    """Remove the methods and parameter rows not in a microversion."""
+    # The nodes to drop grouped by parent, each parent is rebuilt once.
+    parents: dict[int, tuple[nodes.Element, set[int]]] = {}
+    details = set()
+    for _, node in list(mv_elements(doctree)):
+        if in_mv_range(node, version):
+            continue
         if isinstance(node, rest_method):
-            rest_node = node
-            rest_method_section = node.parent
-            rest_section = rest_method_section.parent
-            gp = rest_section.parent
-
-            # Added required classes to the top section
-            rest_section.attributes['classes'].append('api-detail')
-            rest_section.attributes['classes'].append('collapse')
-
-            # Pop the title off the collapsed section
-            title = rest_section.children.pop(0)
-            rest_node['desc'] = title.children[0]
-
-            # In order to get the links in the sidebar to be right, we
-            # have to do some id flipping here late in the game. The
-            # rest_method_section has basically had a dummy id up
-            # until this point just to keep it from colliding with
-            # it's parent.
-            rest_section.attributes['ids'][0] = "{}-detail".format(
-                rest_section.attributes['ids'][0]
+            # The method line and its collapsed details section.
+            node = node.parent
+            details.add(f"{node['ids'][0]}-detail")
+        parent = node.parent
+        _, dropped = parents.setdefault(id(parent), (parent, set()))
+        dropped.add(id(node))
+
+    for parent, dropped in parents.values():
+        parent[:] = [
+            child
+            for child in parent.children
+            if id(child) not in dropped
+            and not (
+                isinstance(child, nodes.Element)
+                and details.intersection(child['ids'])
             )
-            rest_method_section.attributes['ids'][0] = rest_node['target']
+        ]
+
+
+def keep_mv_doctree(
+    app: Sphinx, doctree: nodes.document, docname: str
+) -> None:
+    """Keep a copy of the resolved doctree of the microversion pages.
+
+    It is taken once every doctree-resolved handler has run, so the
+    pages are filtered from the doctree the complete page is written
+    from, without resolving it again.
+    """
+    if docname in MV_PAGE_DOCNAMES:
+        MV_DOCTREES[docname] = doctree.deepcopy()
+
+
+def filter_local_toc(
+    builder: StandaloneHTMLBuilder, docname: str, doctree: nodes.document
+) -> nodes.Node:
+    """Return the local toc of docname, less the sections not in doctree."""
+    ids = {
+        elem_id
+        for node in doctree.findall(nodes.Element)
+        for elem_id in node['ids']
+    }
+    toc = document_toc(builder.env, docname, builder.tags)
+    for item in list(toc.findall(nodes.list_item)):
+        ref = item.next_node(nodes.reference)
+        anchor = ref['anchorname'][1:] if ref is not None else ''
+        if anchor and anchor not in ids and item.parent is not None:
+            item.parent.remove(item)
+    for sublist in list(toc.findall(nodes.bullet_list)):
+        if not sublist.children and sublist.parent is not None:
+            sublist.parent.remove(sublist)
+    return toc
+
+
+def render_doc_context(
+    builder: StandaloneHTMLBuilder, docname: str, doctree: nodes.document
+) -> dict[str, Any]:
+    """Return the page context write_doc makes of doctree.
+
+    write_doc hands the context to handle_page, which is replaced while
+    it runs so nothing is written over the complete page.
+    """
+    builder.imgpath = relative_uri(
+        builder.get_target_uri(docname), builder.imagedir
+    )
+    builder.post_process_images(doctree)
+
+    contexts: list[dict[str, Any]] = []
+
+    def handle_page(
+        pagename: str, addctx: dict[str, Any], *args: Any, **kwargs: Any
+    ) -> None:
+        contexts.append(addctx)
+
+    # Put back whatever was set on the builder itself, e.g. by a theme.
+    own_handle_page = vars(builder).get('handle_page')
+    builder.handle_page = handle_page  # type: ignore[method-assign]
+    try:
+        builder.write_doc(docname, doctree)
+    finally:
+        if own_handle_page is None:
+            del builder.handle_page
+        else:
+            builder.handle_page = own_handle_page  # type: ignore[method-assign]
+    ctx = contexts[0]
+    # The local toc is made from the sections of the complete page.
+    toc = filter_local_toc(builder, docname, doctree)
+    ctx['toc'] = builder.render_partial(toc)['fragment']
+    ctx['display_toc'] = len(list(toc.findall(nodes.reference))) > 1
+    # There is no source of its own to copy for the "show source" link,
+    # the complete page has it.
+    ctx['sourcename'] = ''
+    return ctx
+
+
+def collect_microversion_pages(
+    app: Sphinx,
+) -> Iterator[tuple[str, dict[str, Any], str]]:
+    """Render the pages filtered for os_api_ref_render_microversions.
+
+    They are rendered from the same doctree as the complete page, less
+    the methods and parameters out of the microversion range, and are
+    written next to it, e.g. ``index.2.1.html`` or
+    ``index.latest.html``.
+    """
+    for label in app.config.os_api_ref_render_microversions:
+        if label != 'latest' and parse_version(label) is None:
+            LOG.warning(
+                "Invalid microversion in os_api_ref_render_microversions: %s",
+                label,
+            )
+
+    builder = app.builder
+    assert isinstance(builder, StandaloneHTMLBuilder)
+    doctrees = dict(sorted(MV_DOCTREES.items()))
+    MV_DOCTREES.clear()
+    MV_PAGE_DOCNAMES.clear()
+    for docname, resolved in doctrees.items():
+        for version, pagename in microversion_pages(app, docname):
+            doctree = resolved.deepcopy()
+            parsed = parse_version(version)
+            assert parsed is not None
+            filter_microversion(doctree, parsed)
+            for node in doctree.findall(rest_expand_all):
+                node['mv_version'] = version
+                node['mv_all_uri'] = builder.get_relative_uri(
+                    pagename, docname
+                )
+                node['mv_index'] = {}
+            yield (
+                pagename,
+                render_doc_context(builder, docname, doctree),
+                'page.html',
+            )
+
+
+def clear_mv_doctrees(
+    app: Sphinx, env: BuildEnvironment, docnames: list[str]
+) -> None:
+    MV_PAGE_DOCNAMES.clear()
+    MV_DOCTREES.clear()
+
+
+def clear_parse_cache(
+    app: Sphinx, env: BuildEnvironment, docnames: list[str]
+) -> None:
+    parse_cache.clear()
+
 
-            # Pop the overall section into it's grand parent,
-            # right before where the current parent lives
-            idx = gp.children.index(rest_section)
-            rest_section.remove(rest_method_section)
-            gp.insert(idx, rest_method_section)
+# Find the yaml files referenced by a document, without parsing it.
+PARAM_FILE_RE = re.compile(r'^\s*\.\.\s+rest_parameters::\s+(\S+)\s*$', re.M)
+STATUS_FILE_RE = re.compile(
+    r'^\s*\.\.\s+rest_status_code::\s+\S+\s+(\S+)\s*$', re.M
+)
+
+
+def preload_yaml_files(
+    app: Sphinx, env: BuildEnvironment, docnames: list[str]
+) -> None:
+    """Parse the yaml files referenced by the documents to be read.
+
+    With ``sphinx-build -j N`` documents are read by forked worker
+    processes, which each start with a copy of the caches of the main
+    process. Loading every referenced file here, before the fork,
+    means each file is parsed and checked once per build instead of
+    once per worker.
+    """
+    if app.parallel <= 1:
+        return
+
+    for docname in docnames:
+        try:
+            with open(
+                env.doc2path(docname), encoding=env.config.source_encoding
+            ) as stream:
+                source = stream.read()
+        except OSError:
+            continue
+
+        # Missing files are left for the directives to report, so
+        # the warnings are the same as for a serial build.
+        for match in PARAM_FILE_RE.finditer(source):
+            _, fpath = env.relfn2path(match.group(1), docname)
+            if os.path.isfile(fpath):
+                load_param_file(env, fpath, docname)
+        for match in STATUS_FILE_RE.finditer(source):
+            _, fpath = env.relfn2path(match.group(1), docname)
+            if os.path.isfile(fpath):
+                load_status_file(fpath)
+
+
+def copy_if_changed(source: str, dest: str) -> bool:
+    """Copy source to dest, unless dest already has the same content.
+
+    A matching size and mtime is taken as the same content, otherwise
+    the files are compared. Returns whether the file was copied.
+    """
+    src_st = os.stat(source)
+    try:
+        dest_st = os.stat(dest)
+    except OSError:
+        dest_st = None
+
+    if dest_st is not None and dest_st.st_size == src_st.st_size:
+        if dest_st.st_mtime_ns == src_st.st_mtime_ns:
+            return False
+        if filecmp.cmp(source, dest, shallow=False):
+            # Same content, bring the mtime in line so the next build
+            # doesn't need to compare them again.
+            os.utime(dest, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+            return False
+
+    shutil.copyfile(source, dest)
+    os.utime(dest, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    return True
 
 
 def copy_assets(app: Sphinx, exception: Exception | None) -> None:
@@ -716,24 +1378,37 @@ def copy_assets(app: Sphinx, exception: Exception | None) -> None:
     builders = ('html', 'readthedocs', 'readthedocssinglehtmllocalmedia')
     if app.builder.name not in builders or exception:
         return
-    dirtree = os.path.join(app.builder.outdir, '_static/fonts')
-    if not os.path.exists(dirtree):
-        os.makedirs(dirtree)
-    LOG.info('Copying assets: %s', ', '.join(assets))
-    LOG.info('Copying fonts: %s', ', '.join(fonts))
-    for asset in assets:
-        dest = os.path.join(app.builder.outdir, '_static', asset)
-        source = os.path.abspath(os.path.dirname(__file__))
-        copyfile(os.path.join(source, 'assets', asset), dest)
-    for font in fonts:
-        dest = os.path.join(app.builder.outdir, '_static/fonts', font)
-        source = os.path.abspath(os.path.dirname(__file__))
-        copyfile(os.path.join(source, 'assets', font), dest)
+    static = os.path.join(app.builder.outdir, '_static')
+    os.makedirs(os.path.join(static, 'fonts'), exist_ok=True)
+    source = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'assets')
+
+    files = [(asset, asset) for asset in assets]
+    files += [(font, os.path.join('fonts', font)) for font in fonts]
+    copied, unchanged = bundle.write(static)
+    for name, dest in files:
+        if copy_if_changed(
+            os.path.join(source, name), os.path.join(static, dest)
+        ):
+            copied.append(name)
+        else:
+            unchanged[name] = os.path.getsize(os.path.join(source, name))
+
+    if copied:
+        LOG.info('Copying assets: %s', ', '.join(copied))
+    if unchanged:
+        LOG.info(
+            'Skipped %d unchanged assets (%d bytes)',
+            len(unchanged),
+            sum(unchanged.values()),
+        )
 
 
 def add_assets(app: Sphinx) -> None:
-    app.add_css_file('api-site.css')
-    app.add_js_file('api-site.js')
+    # The pages use the minified and fingerprinted bundle, the original
+    # files are still copied for anything linking to them directly.
+    assets = bundle.build()
+    app.add_css_file(assets['api-site.css'][0])
+    app.add_js_file(assets['api-site.js'][0])
 
 
 def setup(app: Sphinx) -> dict[str, Any]:
@@ -741,6 +1416,12 @@ def setup(app: Sphinx) -> dict[str, Any]:
     app.add_config_value('os_api_ref_max_microversion', '', 'env')
     app.add_config_value('os_api_ref_min_microversion', '', 'env')
     app.add_config_value('os_api_ref_release_microversions', '', 'env')
+    app.add_config_value('os_api_ref_render_microversions', [], 'html')
+    app.add_config_value('os_api_ref_lazy_details', False, 'html')
+    app.add_config_value('os_api_ref_extra_http_codes', {}, 'env')
+    app.add_config_value('os_api_ref_profile', False, '')
+    app.add_config_value('os_api_ref_api_index', '', '')
+    app.add_config_value('os_api_ref_openapi', '', '')
     # TODO(sdague): if someone wants to support latex/pdf, or man page
     # generation using these stanzas, here is where you'd need to
     # specify content specific renderers.
@@ -764,11 +1445,47 @@ def setup(app: Sphinx) -> dict[str, Any]:
     app.add_directive('rest_expand_all', RestExpandAllDirective)
     app.add_directive('rest_status_code', HTTPResponseCodeDirective)
 
+    # Merge the extra HTTP codes once, for all the directives.
+    app.connect('config-inited', merge_extra_codes)
+
     # The doctree-read hook is used do the slightly crazy doc
     # transformation that we do to get the rest_method document
     # structure.
     app.connect('doctree-read', resolve_rest_references)
 
+    # Index the microversions of the page for its selector.
+    app.connect('doctree-resolved', build_mv_index)
+    app.connect('doctree-resolved', keep_mv_doctree, priority=900)
+    app.connect('html-collect-pages', collect_microversion_pages)
+    app.connect('env-before-read-docs', clear_mv_doctrees)
+
+    # Leave the details of the methods out of the initial DOM.
+    app.connect('doctree-resolved', add_lazy_details)
+
+    # Warm the yaml caches before sphinx forks the parallel readers.
+    app.connect('env-before-read-docs', clear_parse_cache)
+    app.connect('env-before-read-docs', preload_yaml_files)
+
+    # Record where the time of the build goes, when asked to. The
+    # records are moved into the environment once the yaml files are
+    # preloaded, and after each document is read.
+    app.connect('config-inited', profile.enable)
+    app.connect('env-before-read-docs', profile.reset, priority=400)
+    app.connect('env-before-read-docs', profile.flush_main, priority=900)
+    app.connect('doctree-read', profile.flush_doc, priority=900)
+    app.connect('env-merge-info', profile.merge_info)
+    app.connect('build-finished', profile.report)
+
+    # Keep the API model of the build by document.
+    app.connect('env-purge-doc', model.purge_doc)
+    app.connect('env-merge-info', model.merge_info)
+
+    # Write the API model for other tools, when asked to.
+    app.connect('build-finished', export.write_exports)
+
+    # Write the index of the methods for the search box.
+    app.connect('build-finished', search.write_search_index)
+
     # Add all the static assets to our build during the early stage of building
     app.connect('builder-inited', add_assets)
 
@@ -779,5 +1496,7 @@ def setup(app: Sphinx) -> dict[str, Any]:
     return {
         'parallel_read_safe': True,
         'parallel_write_safe': True,
+        # Rebuild the environments pickled without the API model.
+        'env_version': 1,
         'version': __version__,
     }
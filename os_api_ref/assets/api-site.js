@@ -1,12 +1,25 @@
 window.onload = function() {
-    // the list of expanded element ids
-    var expanded = [];
-    // whether we should sync expand changes with the location
-    // url. We need to make this false during large scale
-    // operations because we're using the history API, which is
-    // expensive. So a bulk expand turns this off, expands
-    // everything, turns it back on, then does a history sync.
-    var should_sync = true;
+    // the ids of the expanded sections
+    var expanded = new Set();
+    // the pending update of the url with the expanded sections.
+    var sync_timer = null;
+    // how long to wait for more changes before updating the url.
+    var SYNC_DELAY = 250;
+    // the ordinal the build gave every section, and the other way
+    // around.
+    var section_ordinals = {};
+    var ordinal_sections = {};
+    // bumped on every click of the expand all button, so a batched
+    // "Show All" still running stops when it is clicked again.
+    var expand_run = 0;
+    // how many lazy sections "Show All" renders per animation frame.
+    var HYDRATE_BATCH = 20;
+    // the index of the methods searched, loaded once the search box
+    // is first used.
+    var search_index = null;
+    var search_loading = false;
+    // how many methods the search box lists at most.
+    var SEARCH_LIMIT = 20;
 
     $(document).ready(function() {
         // Change the text on the expando buttons when
@@ -16,92 +29,266 @@ window.onload = function() {
         $('.api-detail')
             .on('hide.bs.collapse', function(e) {
                 processButton(this, 'detail');
-                var index = expanded.indexOf(this.id);
-                if (index > -1) {
-                    expanded.splice(index, 1);
-                }
+                expanded.delete(this.id);
                 sync_expanded();
             })
             .on('show.bs.collapse', function(e) {
+                hydrate(this);
                 processButton(this, 'close');
-                expanded.push(this.id);
+                expanded.add(this.id);
                 sync_expanded();
             });
 
-        // Expand the world. Wires up the expand all button, it turns
-        // off the sync while it is running to save the costs with the
-        // history API.
+        // Expand the world. Wires up the expand all button, the
+        // sections are all shown or hidden in one go, without
+        // collapse events and transitions, and the history is synced
+        // once at the end.
         var expandAllActive = true;
         $('#expand-all').click(function () {
-            should_sync = false;
+            var run = ++expand_run;
             if (expandAllActive) {
                 expandAllActive = false;
-                $('.api-detail').collapse('show');
+                // Lazy sections are rendered and shown a batch per
+                // frame, so the page stays responsive meanwhile.
+                var sections = $('.api-detail').get();
+                var batch = $('template.api-detail-lazy').length ?
+                    HYDRATE_BATCH : sections.length;
+                var show_batch = function(start) {
+                    if (run != expand_run) {
+                        return;
+                    }
+                    var shown = sections.slice(start, start + batch);
+                    for (var i = 0; i < shown.length; i++) {
+                        hydrate(shown[i]);
+                    }
+                    set_sections(shown, true);
+                    if (start + batch < sections.length) {
+                        requestAnimationFrame(function() {
+                            show_batch(start + batch);
+                        });
+                    } else {
+                        sync_expanded();
+                    }
+                };
+                show_batch(0);
                 $('#expand-all').attr('data-toggle', '');
                 $(this).text('Hide All');
             } else {
                 expandAllActive = true;
-                $('.api-detail').collapse('hide');
+                set_sections($('.api-detail').get(), false);
+                sync_expanded();
                 $('#expand-all').attr('data-toggle', 'collapse');
                 $(this).text('Show All');
             }
-            should_sync = true;
-            sync_expanded();
         });
 
-        // if there is an expanded parameter passed in a url, we run
-        // through and expand all the appropriate things.
-        if (window.location.search.substring(1).indexOf("expanded") > -1) {
-            should_sync = false;
-            var parts = window.location.search.substring(1).split('&');
-            for (var i = 0; i < parts.length; i++) {
-                var keyval = parts[i].split('=');
-                if (keyval[0] == "expanded" && keyval[1]) {
-                    var expanded_ids = keyval[1].split(',');
-                    for (var j = 0; j < expanded_ids.length; j++) {
-                        $('#' + expanded_ids[j]).collapse('show');
-                    }
-                }
+        $('.btn-detail[data-ordinal]').each(function() {
+            var ordinal = parseInt($(this).attr('data-ordinal'), 10);
+            var section = $(this).attr('data-bs-target').substring(1);
+            if (!isNaN(ordinal)) {
+                section_ordinals[section] = ordinal;
+                ordinal_sections[ordinal] = section;
             }
-            should_sync = true;
+        });
+
+        // if there are expanded sections passed in the url, they are
+        // all shown at once.
+        var restored = restore_expanded();
+
+        // The target of the url might be in a section which isn't
+        // rendered yet.
+        reveal_hash();
+        $(window).on('hashchange', reveal_hash);
+
+        if (restored) {
             // This is needed because the hash *might* be inside a
             // collapsed section.
-            //
-            // NOTE(sdague): this doesn't quite seem to work while
-            // we're changing the rest of the document.
-            $(document.body).scrollTop($(window.location.hash).offset().top);
+            var target = $(window.location.hash);
+            if (target.length) {
+                $(document.body).scrollTop(target.offset().top);
+            }
         }
 
+        // Wire up the search box. Enter opens the first method found,
+        // the methods of this page are expanded in place.
+        $('#api-search')
+            .on('focus input', load_search_index)
+            .on('input', run_search)
+            .on('keydown', function(e) {
+                if (e.key == 'Enter') {
+                    var first = $('#api-search-results a').get(0);
+                    if (first) {
+                        e.preventDefault();
+                        first.click();
+                    }
+                } else if (e.key == 'Escape') {
+                    $(this).val('');
+                    run_search();
+                }
+            });
+        $('#api-search-results').on('click', 'a', function(e) {
+            if (open_method($(this).attr('data-page'),
+                            $(this).attr('data-target'))) {
+                e.preventDefault();
+            }
+            $('#api-search').val('');
+            run_search();
+        });
+
         // Wire up microversion selector
-        $('.mv_selector').on('click', function(e) {
-            var version = e.currentTarget.innerHTML;
-            // flip what is active
-            $(this).addClass('active').siblings().removeClass('active');
-            if (version == "All") {
-                reset_microversion();
+        $('#mv_select').on('change', function(e) {
+            // Microversions rendered as pages of their own link to
+            // them, the others are filtered in place.
+            var href = $(this).find(':selected').data('href');
+            if (href) {
+                window.location.href = href + window.location.hash;
             } else {
-                set_microversion(version);
+                set_microversion(this.value);
             }
         });
     });
+    // In the lazy details mode, the content of every details section
+    // is an inert <template> until the section is first shown.
+    function hydrate(section) {
+        $(section).children('template.api-detail-lazy').each(function() {
+            this.replaceWith(this.content);
+        });
+    }
+
+    // Render and show the section holding the target of the url hash,
+    // if it is still in its template.
+    function reveal_hash() {
+        var id = decodeURIComponent(window.location.hash.substring(1));
+        if (!id || document.getElementById(id)) {
+            return;
+        }
+        $('template.api-detail-lazy').each(function() {
+            if (this.content.getElementById(id)) {
+                var section = this.parentNode;
+                hydrate(section);
+                $(section).collapse('show');
+                document.getElementById(id).scrollIntoView();
+                return false;
+            }
+        });
+    }
+
     /**
      * Helper function for setting the text, styles for expandos
      */
     function processButton(button, text) {
-        $('#' + $(button).attr('id') + '-btn').text(text)
-            .toggleClass('btn-info')
-            .toggleClass('btn-default');
+        set_buttons($('#' + $(button).attr('id') + '-btn'), text == 'close');
+    }
+
+    function set_buttons(buttons, shown) {
+        buttons.text(shown ? 'close' : 'detail')
+            .toggleClass('btn-info', !shown)
+            .toggleClass('btn-default', shown)
+            .toggleClass('collapsed', !shown)
+            .attr('aria-expanded', shown ? 'true' : 'false');
     }
 
-    // Take the expanded array and push it into history. Because
-    // sphinx is building css appropriate ids, they should not have
-    // any special characters we need to encode. So we can simply join
-    // them into a comma separated list.
+    // Show or hide sections at once. The classes Bootstrap keeps the
+    // collapse state in are set directly, so no event is fired and no
+    // transition started per section, and the buttons are updated in
+    // a single pass.
+    function set_sections(sections, shown) {
+        var buttons = [];
+        for (var i = 0; i < sections.length; i++) {
+            var button = document.getElementById(sections[i].id + '-btn');
+            if (button) {
+                buttons.push(button);
+            }
+            if (shown) {
+                expanded.add(sections[i].id);
+            } else {
+                expanded.delete(sections[i].id);
+            }
+        }
+        $(sections).toggleClass('show', shown);
+        set_buttons($(buttons), shown);
+    }
+
+    // Put the expanded sections in the url, as a base64 bitset of
+    // their ordinals. The url is only replaced once the changes have
+    // settled, rather than adding a history entry for every click.
     function sync_expanded() {
-        if (should_sync) {
-            var url = UpdateQueryString('expanded', expanded.join(','));
-            history.pushState('', 'new expand', url);
+        clearTimeout(sync_timer);
+        sync_timer = setTimeout(function() {
+            var ordinals = [];
+            expanded.forEach(function(id) {
+                if (id in section_ordinals) {
+                    ordinals.push(section_ordinals[id]);
+                }
+            });
+            var url = UpdateQueryString('expanded', null);
+            url = UpdateQueryString(
+                'x', ordinals.length ? encode_ordinals(ordinals) : null, url);
+            history.replaceState(history.state, '', url);
+        }, SYNC_DELAY);
+    }
+
+    // Show the sections listed in the url, either in the x bitset or
+    // in the comma separated ids of older urls. Returns whether there
+    // were any.
+    function restore_expanded() {
+        var sections = [];
+        var parts = window.location.search.substring(1).split('&');
+        for (var i = 0; i < parts.length; i++) {
+            var keyval = parts[i].split('=');
+            var ids = [];
+            if (keyval[0] == 'x' && keyval[1]) {
+                ids = decode_ordinals(keyval[1]).map(function(ordinal) {
+                    return ordinal_sections[ordinal];
+                });
+            } else if (keyval[0] == 'expanded' && keyval[1]) {
+                ids = keyval[1].split(',');
+            }
+            for (var j = 0; j < ids.length; j++) {
+                var section = ids[j] && document.getElementById(ids[j]);
+                if (section && $(section).hasClass('api-detail')) {
+                    hydrate(section);
+                    sections.push(section);
+                }
+            }
+        }
+        if (!sections.length) {
+            return false;
+        }
+        set_sections(sections, true);
+        sync_expanded();
+        return true;
+    }
+
+    function encode_ordinals(ordinals) {
+        var bytes = [];
+        for (var i = 0; i < ordinals.length; i++) {
+            var index = ordinals[i] >> 3;
+            while (bytes.length <= index) {
+                bytes.push(0);
+            }
+            bytes[index] |= 1 << (ordinals[i] & 7);
+        }
+        return btoa(String.fromCharCode.apply(null, bytes))
+            .replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+    }
+
+    function decode_ordinals(text) {
+        var ordinals = [];
+        var bytes;
+        try {
+            bytes = atob(text.replace(/-/g, '+').replace(/_/g, '/'));
+        } catch (e) {
+            return ordinals;
+        }
+        for (var i = 0; i < bytes.length; i++) {
+            for (var bit = 0; bit < 8; bit++) {
+                if (bytes.charCodeAt(i) & (1 << bit)) {
+                    ordinals.push(i * 8 + bit);
+                }
+            }
         }
+        return ordinals;
     }
 
 
@@ -138,27 +325,223 @@ window.onload = function() {
         }
     }
 
-    // Set the Y value of the microversion to turn on / off visibility
-    // of components.
-    function set_microversion(number) {
-        var major = number.split(".")[0];
-        var micro = number.split(".")[1];
-        for (var i = os_min_mv; i <= os_max_mv; i++) {
-            var max_class = ".rp_max_ver_" + major + "_" + i;
-            var min_class = ".rp_min_ver_" + major + "_" + i;
-            if (i < micro) {
-                $(max_class).hide(400);
-                $(min_class).show(400);
-            } else if (i >= micro) {
-                $(min_class).hide(400);
-                $(max_class).show(400);
+    function load_search_index() {
+        if (search_loading) {
+            return;
+        }
+        search_loading = true;
+        var script = document.createElement('script');
+        script.src = $('#api-search').attr('data-root') +
+            '_static/api-search-index.js';
+        script.onload = function() {
+            search_index = window.osApiRefSearchIndex;
+            // The lists of the trigrams are stored as differences.
+            for (var gram in search_index.grams) {
+                var ids = search_index.grams[gram];
+                for (var i = 1; i < ids.length; i++) {
+                    ids[i] += ids[i - 1];
+                }
             }
+            // The text of every method, as the build made its
+            // trigrams.
+            search_index.texts = search_index.entries.map(function(entry) {
+                return entry.slice(2).join(' ').toLowerCase();
+            });
+            run_search();
+        };
+        document.head.appendChild(script);
+    }
+
+    // Intersect two sorted lists of numbers.
+    function intersect(a, b) {
+        var result = [];
+        var i = 0, j = 0;
+        while (i < a.length && j < b.length) {
+            if (a[i] < b[j]) {
+                i++;
+            } else if (a[i] > b[j]) {
+                j++;
+            } else {
+                result.push(a[i]);
+                i++;
+                j++;
+            }
+        }
+        return result;
+    }
+
+    // Return the entries of the methods matching all the words of
+    // query, earliest matches first. Only the methods having the
+    // trigrams of the words are looked at. The lists of the trigrams
+    // are intersected shortest first, and only until there are few
+    // methods left, as they are checked anyway.
+    function search_methods(index, query, limit) {
+        var words = query.toLowerCase().split(/\s+/).filter(Boolean);
+        if (!words.length) {
+            return [];
+        }
+        var lists = [];
+        for (var i = 0; i < words.length; i++) {
+            for (var j = 0; j + 3 <= words[i].length; j++) {
+                var gram = words[i].substring(j, j + 3);
+                if (!index.grams.hasOwnProperty(gram)) {
+                    return [];
+                }
+                lists.push(index.grams[gram]);
+            }
+        }
+        lists.sort(function(a, b) {
+            return a.length - b.length;
+        });
+        var candidates = lists.length ? lists[0] : null;
+        for (i = 1; i < lists.length && candidates.length > limit; i++) {
+            candidates = intersect(candidates, lists[i]);
+        }
+        // The best matches as [score, id], sorted. Only those are
+        // kept, rather than sorting all the matches of a short query.
+        var found = [];
+        var count = candidates === null ?
+            index.entries.length : candidates.length;
+        for (var k = 0; k < count; k++) {
+            var id = candidates === null ? k : candidates[k];
+            var text = index.texts[id];
+            var score = 0;
+            for (i = 0; i < words.length; i++) {
+                var pos = text.indexOf(words[i]);
+                if (pos < 0) {
+                    break;
+                }
+                score += pos;
+            }
+            if (i < words.length ||
+                (found.length == limit && score >= found[limit - 1][0])) {
+                continue;
+            }
+            var at = found.length;
+            while (at > 0 && found[at - 1][0] > score) {
+                at--;
+            }
+            found.splice(at, 0, [score, id]);
+            if (found.length > limit) {
+                found.pop();
+            }
+        }
+        return found.map(function(match) {
+            return index.entries[match[1]];
+        });
+    }
+
+    function run_search() {
+        var list = $('#api-search-results').empty();
+        if (search_index === null) {
+            return;
+        }
+        var root = $('#api-search').attr('data-root');
+        var entries = search_methods(
+            search_index, $('#api-search').val(), SEARCH_LIMIT);
+        for (var i = 0; i < entries.length; i++) {
+            var page = search_index.pages[entries[i][0]];
+            var target = entries[i][1];
+            // Other pages expand the method from the url.
+            var href = root + page + '?expanded=' +
+                encodeURIComponent(target + '-detail') + '#' + target;
+            $('<a class="list-group-item"></a>')
+                .attr({'href': href, 'data-page': page,
+                       'data-target': target})
+                .append(
+                    $('<span class="badge"></span>')
+                        .addClass('label-' + entries[i][2])
+                        .text(entries[i][2]),
+                    ' ',
+                    $('<span class="endpoint-url"></span>')
+                        .text(entries[i][3]),
+                    ' ',
+                    $('<span></span>').text(entries[i][4]))
+                .appendTo(list);
+        }
+    }
+
+    // Expand and scroll to a method of this page. Returns false for
+    // the methods of other pages.
+    function open_method(page, target) {
+        var section = document.getElementById(target + '-detail');
+        if (page != $('#api-search').attr('data-page') || !section) {
+            return false;
         }
+        hydrate(section);
+        set_sections([section], true);
+        sync_expanded();
+        history.replaceState(history.state, '', '#' + target);
+        document.getElementById(target + '-operation').scrollIntoView();
+        return true;
     }
 
-    function reset_microversion() {
-        $('[class^=rp_min_ver]').show(400);
-        $('[class^=rp_max_ver]').show(400);
+    // Show only the methods and parameters available in a
+    // microversion, or everything for an empty version. Instead of
+    // visiting the matching elements, the ids to hide are written
+    // into a single stylesheet, so selecting a version costs one style
+    // recalculation however large the page is.
+    var mv_style = null;
+    function set_microversion(number) {
+        if (mv_style === null) {
+            mv_style = document.createElement('style');
+            document.head.appendChild(mv_style);
+        }
+        mv_style.textContent = microversion_rule(number);
+    }
+
+    // The microversion range of every method and parameter row of the
+    // page, as [id, min, max] with parsed versions, read once from the
+    // index written by the build.
+    var mv_index = null;
+    // The rules already built, by microversion.
+    var mv_rules = {};
+
+    function parse_version(version) {
+        if (!version) {
+            return null;
+        }
+        var parts = version.split(".");
+        return [parseInt(parts[0], 10), parseInt(parts[1], 10)];
+    }
+
+    function compare_versions(a, b) {
+        return a[0] - b[0] || a[1] - b[1];
+    }
+
+    function load_mv_index() {
+        var data = document.getElementById('mv-index');
+        var index = data ? JSON.parse(data.textContent) : {};
+        mv_index = [];
+        for (var id in index) {
+            mv_index.push(
+                [id, parse_version(index[id][0]), parse_version(index[id][1])]);
+        }
+    }
+
+    // Build the rule hiding what was added after the microversion,
+    // or removed before it. Both min and max versions are inclusive.
+    function microversion_rule(number) {
+        if (!number) {
+            return '';
+        }
+        if (!(number in mv_rules)) {
+            if (mv_index === null) {
+                load_mv_index();
+            }
+            var version = parse_version(number);
+            var hidden = [];
+            for (var i = 0; i < mv_index.length; i++) {
+                var min = mv_index[i][1], max = mv_index[i][2];
+                if ((min && compare_versions(version, min) < 0) ||
+                    (max && compare_versions(version, max) > 0)) {
+                    hidden.push("#" + mv_index[i][0]);
+                }
+            }
+            mv_rules[number] = hidden.length ?
+                hidden.join(",\n") + " { display: none !important; }" : '';
+        }
+        return mv_rules[number];
     }
 
 };
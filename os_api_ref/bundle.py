@@ -0,0 +1,253 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Minified, fingerprinted and precompressed css and js assets.
+
+The pages reference ``api-site.<hash>.css`` and ``api-site.<hash>.js``
+where the hash is computed from the content, so they can be cached
+forever by browsers and CDNs and a new release of os-api-ref is picked
+up right away. Each of them also gets ``.gz`` (and ``.br`` when the
+brotli module is installed) siblings for web servers serving
+precompressed files.
+
+The minification is deliberately conservative: it only removes
+comments and whitespace which can't change the meaning of the files,
+and leaves the strings (and the regexps of the js) as they are.
+"""
+
+import functools
+import glob
+import gzip
+import hashlib
+import os
+import re
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:
+    brotli = None
+
+ASSETS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'assets')
+ASSETS = ('api-site.css', 'api-site.js')
+
+# Strings and url() are kept as they are, comments are dropped. The
+# leftmost match wins, so a quote in a comment or a comment marker in a
+# string are taken for what they are.
+CSS_TOKEN_RE = re.compile(
+    r"""("(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'"""
+    r"""|url\(\s*(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[^)]*)\s*\))"""
+    r'|/\*.*?\*/',
+    re.S | re.I,
+)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCT_RE = re.compile(r'\s*([{};,])\s*')
+
+# Where the literals taken out of the text are put back.
+PLACEHOLDER_RE = re.compile('\x00([0-9]+)\x00')
+
+# Keywords after which a / starts a regexp rather than a division.
+JS_REGEX_KEYWORDS = frozenset(
+    (
+        'await',
+        'case',
+        'delete',
+        'do',
+        'else',
+        'in',
+        'instanceof',
+        'new',
+        'return',
+        'throw',
+        'typeof',
+        'void',
+        'yield',
+    )
+)
+JS_WORD_CHAR_RE = re.compile(r'[\w$]')
+
+
+def _restore(text: str, literals: list[str]) -> str:
+    return PLACEHOLDER_RE.sub(lambda m: literals[int(m.group(1))], text)
+
+
+def minify_css(text: str) -> str:
+    literals: list[str] = []
+
+    def protect(match: re.Match[str]) -> str:
+        if match.group(1) is None:
+            # A comment separates tokens like a space does.
+            return ' '
+        literals.append(match.group(1))
+        return f'\x00{len(literals) - 1}\x00'
+
+    text = CSS_TOKEN_RE.sub(protect, text)
+    text = CSS_SPACE_RE.sub(' ', text)
+    text = CSS_PUNCT_RE.sub(r'\1', text)
+    text = text.replace(';}', '}').strip() + '\n'
+    return _restore(text, literals)
+
+
+def _regex_allowed(code: list[str]) -> bool:
+    """Whether a / after the code read so far starts a regexp literal."""
+    i = len(code) - 1
+    while i >= 0 and code[i].isspace():
+        i -= 1
+    if i < 0:
+        return True
+    if code[i] in ')]}' or code[i].startswith('\x00'):
+        return False
+    end = i + 1
+    while i >= 0 and JS_WORD_CHAR_RE.fullmatch(code[i]):
+        i -= 1
+    if end == i + 1:
+        return True
+    return ''.join(code[i + 1 : end]) in JS_REGEX_KEYWORDS
+
+
+def _js_literal_end(text: str, i: int) -> int:
+    """Return the end of the string, template or regexp starting at i."""
+    quote = text[i]
+    in_class = False
+    i += 1
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote == '/':
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                return i + 1
+            elif char == '\n':
+                return i
+        elif char == quote:
+            return i + 1
+        elif char == '\n' and quote != '`':
+            return i
+        i += 1
+    return i
+
+
+def minify_js(text: str) -> str:
+    # Comments and the whitespace at the ends of the lines are dropped,
+    # line breaks are kept so automatic semicolon insertion is left
+    # alone. Strings, templates and regexps are set aside first, so
+    # what looks like a comment in them stays.
+    literals: list[str] = []
+    code: list[str] = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if text.startswith('//', i):
+            i = text.find('\n', i)
+            if i == -1:
+                break
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = len(text) if end == -1 else end + 2
+            code.append('\n' if '\n' in text[i:end] else ' ')
+            i = end
+            continue
+        if char in '"\'`' or (char == '/' and _regex_allowed(code)):
+            end = _js_literal_end(text, i)
+            literals.append(text[i:end])
+            code.append(f'\x00{len(literals) - 1}\x00')
+            i = end
+            continue
+        code.append(char)
+        i += 1
+    lines = [line.strip() for line in ''.join(code).splitlines()]
+    text = '\n'.join(line for line in lines if line) + '\n'
+    return _restore(text, literals)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """Return name with a hash of content before its extension."""
+    root, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f'{root}.{digest}{ext}'
+
+
+def compress(content: bytes) -> dict[str, bytes]:
+    """Return the precompressed variants of content, by suffix."""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+    return variants
+
+
+@functools.cache
+def build() -> dict[str, tuple[str, bytes]]:
+    """Return the minified assets as name -> (fingerprinted name, content)"""
+    bundle = {}
+    for name in ASSETS:
+        with open(os.path.join(ASSETS_DIR, name), encoding='utf-8') as f:
+            text = f.read()
+        minify = MINIFIERS[os.path.splitext(name)[1]]
+        content = minify(text).encode('utf-8')
+        bundle[name] = (fingerprint(name, content), content)
+    return bundle
+
+
+def write_if_changed(path: str, content: bytes) -> bool:
+    """Write content to path unless it is already there."""
+    try:
+        if os.path.getsize(path) == len(content):
+            with open(path, 'rb') as f:
+                if f.read() == content:
+                    return False
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(content)
+    return True
+
+
+def write(static_dir: str) -> tuple[list[str], dict[str, int]]:
+    """Write the bundle in static_dir.
+
+    Fingerprinted files left over from other versions are removed.
+    Returns the names of the files written, and the sizes of the ones
+    which were already up to date.
+    """
+    written = []
+    skipped = {}
+    for name, (hashed, content) in build().items():
+        files = {hashed: content}
+        files.update(
+            (hashed + suffix, variant)
+            for suffix, variant in compress(content).items()
+        )
+        for fname, data in files.items():
+            if write_if_changed(os.path.join(static_dir, fname), data):
+                written.append(fname)
+            else:
+                skipped[fname] = len(data)
+
+        # Only the files named the way fingerprint() and compress() do
+        # are ours, other files of the project are left alone.
+        root, ext = os.path.splitext(name)
+        ours = re.compile(
+            rf'{re.escape(root)}\.[0-9a-f]{{12}}{re.escape(ext)}(\.gz|\.br)?'
+        )
+        for stale in glob.glob(os.path.join(static_dir, f'{root}.*{ext}*')):
+            fname = os.path.basename(stale)
+            if fname not in files and ours.fullmatch(fname):
+                os.remove(stale)
+    return written, skipped
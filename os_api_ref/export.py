@@ -0,0 +1,204 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Machine readable exports of the API documented by the build.
+
+``os_api_ref_api_index`` names a json file listing every method with
+its parameters, status codes and microversion range, and
+``os_api_ref_openapi`` a minimal OpenAPI 3 document of the same
+methods. Both are written in the output directory from the API model,
+once the build is finished.
+"""
+
+import json
+import os
+from typing import Any
+
+from sphinx.application import Sphinx
+from sphinx.builders import Builder
+from sphinx.util import logging
+
+from os_api_ref import http_codes
+from os_api_ref import model
+
+LOG = logging.getLogger(__name__)
+
+INDEX_FORMAT = 1
+
+SECTIONS = ('header', 'path', 'query', 'body')
+
+# parameters file types -> OpenAPI schemas
+SCHEMAS: dict[str, dict[str, str]] = {
+    'array': {'type': 'array'},
+    'bool': {'type': 'boolean'},
+    'boolean': {'type': 'boolean'},
+    'float': {'type': 'number'},
+    'int': {'type': 'integer'},
+    'integer': {'type': 'integer'},
+    'object': {'type': 'object'},
+    'string': {'type': 'string'},
+    'uuid': {'type': 'string', 'format': 'uuid'},
+}
+
+
+def api_index(app: Sphinx, builder: Builder) -> dict[str, Any]:
+    """Return the index of the methods of the build."""
+    methods = []
+    for method in model.methods(app.env):
+        parameters: dict[str, list[dict[str, Any]]] = {
+            section: [] for section in SECTIONS
+        }
+        for param in method['parameters']:
+            parameters.setdefault(param['in'], []).append(
+                {
+                    'name': param['name'],
+                    'type': param['type'],
+                    'required': param['required'],
+                    'description': param['description'],
+                    'min_version': param['min_version'],
+                    'max_version': param['max_version'],
+                }
+            )
+        status_codes: dict[str, list[dict[str, Any]]] = {
+            'success': [],
+            'error': [],
+        }
+        for status in method['status_codes']:
+            status_codes.setdefault(status['kind'], []).append(
+                {
+                    'code': status['code'],
+                    'title': http_codes.CODES.get(status['code'], 'Unknown'),
+                    'reason': status['reason'],
+                    'description': status['description'],
+                }
+            )
+        uri = builder.get_target_uri(method['docname'])
+        methods.append(
+            {
+                'method': method['method'],
+                'url': method['url'],
+                'title': method['title'],
+                'docname': method['docname'],
+                'target': method['target'],
+                'uri': f"{uri}#{method['target']}",
+                'min_version': method['min_version'],
+                'max_version': method['max_version'],
+                'parameters': parameters,
+                'status_codes': status_codes,
+            }
+        )
+
+    config = app.config
+    return {
+        'format': INDEX_FORMAT,
+        'project': config.project,
+        'release': config.release,
+        'min_version': config.os_api_ref_min_microversion or None,
+        'max_version': config.os_api_ref_max_microversion or None,
+        'methods': methods,
+    }
+
+
+def openapi(index: dict[str, Any]) -> dict[str, Any]:
+    """Return a minimal OpenAPI 3 document of the methods in index.
+
+    The parameters files don't say whether a body parameter belongs to
+    the request or the response, so only the header, path and query
+    parameters are part of the operations.
+    """
+    paths: dict[str, dict[str, Any]] = {}
+    operation_ids: set[str] = set()
+    for method in index['methods']:
+        verb = method['method'].lower()
+        operations = paths.setdefault(method['url'], {})
+        if verb in operations:
+            # The same method documented twice, the first one wins.
+            continue
+        parameters = []
+        for section in ('path', 'query', 'header'):
+            for param in method['parameters'].get(section, []):
+                parameters.append(
+                    {
+                        'name': param['name'],
+                        'in': section,
+                        'required': section == 'path' or param['required'],
+                        'description': param['description'],
+                        'schema': SCHEMAS.get(param['type'], {}),
+                    }
+                )
+        responses: dict[str, dict[str, str]] = {}
+        for kind in ('success', 'error'):
+            for status in method['status_codes'].get(kind, []):
+                responses.setdefault(
+                    str(status['code']),
+                    {
+                        'description': status['description'].strip()
+                        or status['title'],
+                    },
+                )
+        # The anchors are only unique within a document.
+        operation_id = method['target']
+        if operation_id in operation_ids:
+            operation_id = f"{method['docname']}-{operation_id}"
+        operation_ids.add(operation_id)
+        operation: dict[str, Any] = {
+            'summary': method['title'],
+            'operationId': operation_id,
+        }
+        if parameters:
+            operation['parameters'] = parameters
+        operation['responses'] = responses or {'default': {'description': ''}}
+        versions = {
+            key: method[key]
+            for key in ('min_version', 'max_version')
+            if method[key]
+        }
+        if versions:
+            operation['x-openstack-microversions'] = versions
+        operations[verb] = operation
+
+    return {
+        'openapi': '3.0.3',
+        'info': {
+            'title': index['project'] or 'API',
+            'version': index['release'] or '',
+        },
+        'paths': paths,
+    }
+
+
+def write_json(path: str, data: dict[str, Any]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def write_exports(app: Sphinx, exception: Exception | None) -> None:
+    config = app.config
+    if exception is not None or not (
+        config.os_api_ref_api_index or config.os_api_ref_openapi
+    ):
+        return
+
+    index = api_index(app, app.builder)
+    if config.os_api_ref_api_index:
+        path = os.path.join(app.outdir, config.os_api_ref_api_index)
+        write_json(path, index)
+        LOG.info(
+            "Wrote the API index of %d methods to %s",
+            len(index['methods']),
+            path,
+        )
+    if config.os_api_ref_openapi:
+        path = os.path.join(app.outdir, config.os_api_ref_openapi)
+        write_json(path, openapi(index))
+        LOG.info("Wrote the OpenAPI document to %s", path)
@@ -10,23 +10,155 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from collections.abc import Mapping
+import functools
 from http.client import responses
+from types import MappingProxyType
 from typing import Any
 
 from docutils import nodes
 from docutils.parsers.rst.directives.tables import Table
 from docutils.parsers.rst.states import Body
 from docutils.statemachine import StringList
+from sphinx.application import Sphinx
+from sphinx.config import Config
 from sphinx.util import logging
 from sphinx.writers.html5 import HTML5Translator
 from sphinx.writers.text import TextTranslator
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore[assignment]
+
+from os_api_ref import model
+from os_api_ref import parse_cache
+from os_api_ref import profile
+from os_api_ref import yaml_cache
+
 LOG = logging.getLogger(__name__)
 
-# cache for file -> yaml so we only do the load and check of a yaml
-# file once during a sphinx processing run.
-HTTP_YAML_CACHE: dict[str, dict[int, dict[str, str]]] = {}
+# The reason of every HTTP response code we know about. This includes
+# the codes OpenStack may use that are not part of the httplib
+# response dict.
+HTTP_CODES: Mapping[int, str] = MappingProxyType(
+    {429: "Too Many Requests", **responses}
+)
+
+# HTTP_CODES extended with os_api_ref_extra_http_codes, updated once the
+# configuration is loaded, before any document is read. It is the same
+# read-only view all along, so aliases of it stay current.
+_CODES: dict[int, str] = dict(HTTP_CODES)
+CODES: Mapping[int, str] = MappingProxyType(_CODES)
+
+
+def merge_extra_codes(app: Sphinx, config: Config) -> None:
+    extra = {}
+    for code, reason in dict(config.os_api_ref_extra_http_codes).items():
+        try:
+            extra[int(code)] = str(reason)
+        except (TypeError, ValueError):
+            LOG.warning(
+                "Invalid HTTP code in os_api_ref_extra_http_codes: %s", code
+            )
+    _CODES.clear()
+    _CODES.update(HTTP_CODES)
+    _CODES.update(extra)
+
+
+# A status file as (code, reason) -> text.
+StatusIndex = dict[tuple[int, str], str]
+
+# cache for file -> (mtime, index) so we only do the load and check of
+# a yaml file once during a sphinx processing run, or again when the
+# file changed on disk.
+HTTP_YAML_CACHE: dict[str, tuple[int | None, StatusIndex]] = {}
+
+
+# A problem of a status file as (line, message format, message args).
+Problem = tuple[int, str, tuple[Any, ...]]
+
+
+def _index_status_file(
+    loader: SafeLoader,
+) -> tuple[StatusIndex, list[Problem]]:
+    """Return the index of a status file, and the problems found in it.
+
+    The whole file is checked, so all the problems get reported at
+    once, each with its line.
+    """
+    index: StatusIndex = {}
+    problems: list[Problem] = []
+
+    def problem(node: yaml.Node, fmt: str, *args: Any) -> None:
+        problems.append((node.start_mark.line + 1, fmt, args))
+
+    root = loader.get_single_node()
+    if root is None:
+        problems.append((1, "no status codes defined", ()))
+        return index, problems
+    if not isinstance(root, yaml.MappingNode):
+        problem(root, "expected a mapping of status codes")
+        return index, problems
+
+    for code_node, reasons_node in root.value:
+        code = loader.construct_object(code_node)
+        if not isinstance(code_node, yaml.ScalarNode) or not (
+            isinstance(code, int) and not isinstance(code, bool)
+        ):
+            problem(code_node, "status code %s is not a number", code)
+            continue
+        if not isinstance(reasons_node, yaml.MappingNode):
+            problem(reasons_node, "expected a mapping of reasons for %s", code)
+            continue
+        for reason_node, text_node in reasons_node.value:
+            reason = loader.construct_object(reason_node)
+            text = loader.construct_object(text_node)
+            if not isinstance(text_node, yaml.ScalarNode) or not isinstance(
+                text, str
+            ):
+                problem(text_node, "reason %s of %s is not text", reason, code)
+                continue
+            index[(code, str(reason))] = text
+        if (code, 'default') not in index:
+            problem(code_node, "status code %s has no default reason", code)
+    return index, problems
+
+
+def load_status_file(fpath: str) -> StatusIndex | None:
+    """Load, check and cache the status codes file at fpath."""
+    global HTTP_YAML_CACHE
+    mtime = yaml_cache.mtime(fpath)
+    if fpath in HTTP_YAML_CACHE:
+        cached_mtime, cached_index = HTTP_YAML_CACHE[fpath]
+        if cached_mtime == mtime:
+            profile.count('status_cache.hit')
+            return cached_index
+        del HTTP_YAML_CACHE[fpath]
+
+    # LOG.info("Fpath: %s" % fpath)
+    profile.count('status_cache.miss')
+    try:
+        with open(fpath, 'rb') as stream:
+            loader = SafeLoader(stream)
+            try:
+                index, problems = _index_status_file(loader)
+            finally:
+                loader.dispose()
+    except OSError:
+        LOG.warning("Parameters file %s not found", fpath)
+        return None
+    except yaml.YAMLError as exc:
+        LOG.warning(exc)
+        raise
+
+    # A (docname, line) location would be taken for a document.
+    for line, fmt, args in problems:
+        LOG.warning(fmt, *args, location=f'{fpath}:{line}')
+
+    HTTP_YAML_CACHE[fpath] = (mtime, index)
+    return index
 
 
 class HTTPResponseCodeDirective(Table):
@@ -34,42 +166,19 @@ class HTTPResponseCodeDirective(Table):
 
     status_types = ("success", "error")
 
-    # This is for HTTP response codes that OpenStack may use that are not part
-    # the httplib response dict.
-    CODES: dict[int, str] = {
-        429: "Too Many Requests",
-    }
+    # Kept for the extensions which read it, use os_api_ref_extra_http_codes
+    # to add codes.
+    CODES = CODES
 
     required_arguments = 2
-    yaml: list[tuple[int, str]]
-    status_defs: dict[int, dict[str, str]] | None
+    yaml: list[tuple[int, str, str]]
+    status_defs: StatusIndex | None
+    status_file: str
     col_widths: list[int]
     max_cols: int
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        self.CODES.update(responses)
-        super().__init__(*args, **kwargs)
-
-    def _load_status_file(
-        self, fpath: str
-    ) -> dict[int, dict[str, str]] | None:
-        global HTTP_YAML_CACHE
-        if fpath in HTTP_YAML_CACHE:
-            return HTTP_YAML_CACHE[fpath]
-
-        # LOG.info("Fpath: %s" % fpath)
-        try:
-            with open(fpath) as stream:
-                lookup: dict[int, dict[str, str]] = yaml.safe_load(stream)
-        except OSError:
-            LOG.warning("Parameters file %s not found", fpath)
-            return None
-        except yaml.YAMLError as exc:
-            LOG.warning(exc)
-            raise
-
-        HTTP_YAML_CACHE[fpath] = lookup
-        return lookup
+    def _load_status_file(self, fpath: str) -> StatusIndex | None:
+        return load_status_file(fpath)
 
     def run(self) -> list[nodes.Node]:
         self.env = self.state.document.settings.env
@@ -93,8 +202,11 @@ class HTTPResponseCodeDirective(Table):
             return [error]
 
         _, status_defs_file = self.env.relfn2path(self.arguments.pop())
+        # Rebuild this document when the status file changes.
+        self.env.note_dependency(status_defs_file)
         status_type = self.arguments.pop()
 
+        self.status_file = status_defs_file
         self.status_defs = self._load_status_file(status_defs_file)
 
         # LOG.info("%s" % str(self.status_defs))
@@ -108,6 +220,9 @@ class HTTPResponseCodeDirective(Table):
             return [error]
 
         self.yaml = self._load_codes()
+        model.add_status_codes(
+            self.env, self.state.parent, status_type, self.yaml
+        )
 
         self.max_cols = len(self.headers)
         # TODO(sdague): it would be good to dynamically set column
@@ -138,32 +253,32 @@ class HTTPResponseCodeDirective(Table):
         result.extend(messages)
         return result
 
-    def _load_codes(self) -> list[tuple[int, str]]:
+    @profile.timed('rest_status_code._load_codes')
+    def _load_codes(self) -> list[tuple[int, str, str]]:
         content = "\n".join(self.content)
         parsed = yaml.safe_load(content)
 
-        new_content: list[tuple[int, str]] = list()
+        new_content: list[tuple[int, str, str]] = list()
 
         if self.status_defs is None:
             return new_content
 
         for item in parsed:
             if isinstance(item, int):
-                new_content.append((item, self.status_defs[item]['default']))
+                pairs = [(item, 'default')]
             else:
-                for code, reason in item.items():
-                    try:
-                        new_content.append(
-                            (code, self.status_defs[code][reason])
-                        )
-                    except KeyError:
-                        LOG.warning(
-                            "Could not find %(reason)s for code %(code)s",
-                            {'reason': reason, 'code': code},
-                        )
-                        new_content.append(
-                            (code, self.status_defs[code]['default'])
-                        )
+                pairs = list(item.items())
+            for code, reason in pairs:
+                text = self.status_defs.get((code, reason))
+                if text is None:
+                    LOG.warning(
+                        "Could not find %(reason)s for code %(code)s",
+                        {'reason': reason, 'code': code},
+                    )
+                    reason = 'default'
+                    text = self.status_defs.get((code, reason))
+                if text is not None:
+                    new_content.append((code, reason, text))
 
         return new_content
 
@@ -204,35 +319,49 @@ class HTTPResponseCodeDirective(Table):
         entry.append(node)
         return entry
 
-    def add_desc_col(self, value: str) -> nodes.entry:
-        entry = nodes.entry()
-        result = StringList(value.split('\n'))
-        assert isinstance(self.state, Body)
-        self.state.nested_parse(result, 0, entry)
+    def add_desc_col(self, code: int, reason: str, value: str) -> nodes.entry:
+        # The same reasons (e.g. the default of 404) are listed in many
+        # tables, so reuse the parsed result for a given status file
+        # entry.
+        key = ('status', self.status_file, code, reason)
+        entry = parse_cache.get(
+            key, *self.state_machine.get_source_and_line(self.lineno)
+        )
+        if entry is None:
+            entry = nodes.entry()
+            result = StringList(value.split('\n'))
+            assert isinstance(self.state, Body)
+            self.state.nested_parse(result, 0, entry)
+            parse_cache.store(key, entry)
         return entry
 
+    @profile.timed('rest_status_code.collect_rows')
     def collect_rows(self) -> tuple[list[nodes.row], list[nodes.tgroup]]:
         rows: list[nodes.row] = []
         groups: list[nodes.tgroup] = []
         try:
             # LOG.info("Parsed content is: %s" % self.yaml)
-            for code, desc in self.yaml:
+            for code, reason, desc in self.yaml:
                 h_code = http_code()
                 h_code['code'] = code
-                h_code['title'] = self.CODES.get(code, 'Unknown')
+                h_code['title'] = CODES.get(code, 'Unknown')
 
                 trow = nodes.row()
                 trow += self.add_col(h_code)
-                trow += self.add_desc_col(desc)
+                trow += self.add_desc_col(code, reason, desc)
                 rows.append(trow)
         except AttributeError as exc:
             LOG.warning("Failure on key: %s, values: %s. %s", code, desc, exc)
         return rows, groups
 
 
+@functools.cache
+def render_http_code(code: int, title: str) -> str:
+    return f"<code>{code} - {title}</code>"
+
+
 def http_code_html(self: HTML5Translator, node: "http_code") -> None:
-    tmpl = "<code>%(code)s - %(title)s</code>"
-    self.body.append(tmpl % node)
+    self.body.append(render_http_code(node['code'], node['title']))
     raise nodes.SkipNode
 
 
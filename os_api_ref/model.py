@@ -0,0 +1,184 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""The API documented by the build.
+
+The directives record every ``rest_method``, with the parameters and
+status codes of its ``rest_parameters`` and ``rest_status_code``
+stanzas, in the build environment while the documents are read. It is
+kept by document, so it is purged like the rest of the environment
+when a document is read again, and the methods of the documents read
+by ``-j N`` worker processes are merged back into the main process.
+
+Features spanning the whole API can then go through :func:`methods`
+instead of walking the doctrees of every document.
+"""
+
+from collections.abc import Iterator
+from typing import Any
+from typing import TypedDict
+
+from docutils import nodes
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+
+Parameter = TypedDict(
+    'Parameter',
+    {
+        'name': str,
+        'ref': str,
+        'in': str,
+        'type': str,
+        'required': bool,
+        'description': str,
+        'min_version': str | None,
+        'max_version': str | None,
+    },
+)
+
+
+class StatusCode(TypedDict):
+    code: int
+    reason: str
+    kind: str
+    description: str
+
+
+class Method(TypedDict):
+    docname: str
+    target: str
+    method: str
+    url: str
+    title: str
+    min_version: str | None
+    max_version: str | None
+    parameters: list[Parameter]
+    status_codes: list[StatusCode]
+
+
+# docname -> target -> method, in the order of the document.
+Model = dict[str, dict[str, Method]]
+
+
+def get_model(env: BuildEnvironment) -> Model:
+    if not hasattr(env, 'os_api_ref_model'):
+        env.os_api_ref_model = {}  # type: ignore[attr-defined]
+    return env.os_api_ref_model  # type: ignore[attr-defined,no-any-return]
+
+
+def methods(env: BuildEnvironment) -> Iterator[Method]:
+    """Yield the methods of the build, by document."""
+    model = get_model(env)
+    for docname in sorted(model):
+        yield from model[docname].values()
+
+
+def find_method_node(node: nodes.Element | None) -> nodes.Element | None:
+    """Find the rest_method node a stanza at node belongs to.
+
+    That is the last rest_method declared in the closest enclosing
+    section which has one.
+    """
+    while node is not None:
+        for child in reversed(node.children):
+            if (
+                isinstance(child, nodes.section)
+                and 'detail-control' in child['classes']
+                and child.children
+                and isinstance(child[0], nodes.Element)
+            ):
+                return child[0]
+        node = node.parent
+    return None
+
+
+def add_method(env: BuildEnvironment, node: nodes.Element, title: str) -> None:
+    get_model(env).setdefault(env.docname, {})[node['target']] = {
+        'docname': env.docname,
+        'target': node['target'],
+        'method': node['method'],
+        'url': node['url'],
+        'title': title,
+        'min_version': node['min_version'],
+        'max_version': node['max_version'],
+        'parameters': [],
+        'status_codes': [],
+    }
+
+
+def _find(env: BuildEnvironment, node: nodes.Element) -> Method | None:
+    method_node = find_method_node(node)
+    if method_node is None:
+        return None
+    return get_model(env).get(env.docname, {}).get(method_node['target'])
+
+
+def add_parameters(
+    env: BuildEnvironment,
+    node: nodes.Element,
+    rows: list[tuple[str, str, dict[str, Any]]],
+) -> None:
+    """Record the rows of a rest_parameters stanza at node."""
+    method = _find(env, node)
+    if method is None:
+        return
+    for name, ref, values in rows:
+        method['parameters'].append(
+            {
+                'name': name,
+                'ref': ref,
+                'in': values.get('in', ''),
+                'type': values.get('type', ''),
+                'required': bool(values.get('required', False)),
+                'description': values.get('description', ''),
+                'min_version': values.get('min_version'),
+                'max_version': values.get('max_version'),
+            }
+        )
+
+
+def add_status_codes(
+    env: BuildEnvironment,
+    node: nodes.Element,
+    kind: str,
+    rows: list[tuple[int, str, str]],
+) -> None:
+    """Record the rows of a rest_status_code stanza at node."""
+    method = _find(env, node)
+    if method is None:
+        return
+    for code, reason, description in rows:
+        method['status_codes'].append(
+            {
+                'code': code,
+                'reason': reason,
+                'kind': kind,
+                'description': description,
+            }
+        )
+
+
+def purge_doc(app: Sphinx, env: BuildEnvironment, docname: str) -> None:
+    get_model(env).pop(docname, None)
+
+
+def merge_info(
+    app: Sphinx,
+    env: BuildEnvironment,
+    docnames: list[str],
+    other: BuildEnvironment,
+) -> None:
+    model = get_model(env)
+    other_model = get_model(other)
+    for docname in docnames:
+        if docname in other_model:
+            model[docname] = other_model[docname]
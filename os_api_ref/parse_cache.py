@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Cache of table cells parsed from rst.
+
+The same description (e.g. the one of ``server_id``) is used in
+hundreds of tables across an API reference, and running it through
+the rst parser every time adds up. The cache keeps the parsed
+docutils nodes of a cell, and hands out deep copies of them.
+
+Only cells made of nodes which don't register anything with the
+document or the sphinx environment while being parsed (targets,
+references by name, cross references, footnotes, ...) are cached, as
+copying those into another table or another document would leave them
+dangling.
+"""
+
+from collections.abc import Hashable
+
+from docutils import nodes
+
+# Node types which are safe to copy from one document into another.
+SAFE_NODES = (
+    nodes.Text,
+    nodes.block_quote,
+    nodes.bullet_list,
+    nodes.definition,
+    nodes.definition_list,
+    nodes.definition_list_item,
+    nodes.emphasis,
+    nodes.enumerated_list,
+    nodes.entry,
+    nodes.inline,
+    nodes.line,
+    nodes.line_block,
+    nodes.list_item,
+    nodes.literal,
+    nodes.literal_block,
+    nodes.paragraph,
+    nodes.strong,
+    nodes.term,
+    nodes.title_reference,
+)
+
+# cache for key -> parsed cell contents, reset at the start of every
+# read phase so changed yaml files are parsed again.
+CACHE: dict[Hashable, tuple[nodes.Node, ...]] = {}
+
+
+def _is_safe(node: nodes.Node) -> bool:
+    if isinstance(node, nodes.reference):
+        # Standalone and embedded urls are fine, named or anonymous
+        # references need to be resolved against their own document.
+        return (
+            'refuri' in node
+            and not node['names']
+            and not node.get('refname')
+            and not node.get('anonymous')
+        )
+    if not isinstance(node, SAFE_NODES):
+        return False
+    if isinstance(node, nodes.Element) and (node['ids'] or node['names']):
+        return False
+    return True
+
+
+def cacheable(entry: nodes.Element) -> bool:
+    """Whether the parsed contents of entry can be copied elsewhere."""
+    return all(_is_safe(node) for node in entry.findall())
+
+
+def get(
+    key: Hashable, source: str | None, line: int | None
+) -> nodes.entry | None:
+    """Return a new table entry with a copy of the cached cell.
+
+    The copy is given the source and line of the directive it goes in,
+    so any warning about it points at that document and not at the one
+    the cell was first parsed for.
+    """
+    cached = CACHE.get(key)
+    if cached is None:
+        return None
+    entry = nodes.entry()
+    entry.extend(node.deepcopy() for node in cached)
+    for node in entry.findall(nodes.Element):
+        node.source = source
+        node.line = line
+    return entry
+
+
+def store(key: Hashable, entry: nodes.entry) -> None:
+    """Remember the contents of entry, if it is safe to copy."""
+    if cacheable(entry):
+        CACHE[key] = tuple(node.deepcopy() for node in entry.children)
+
+
+def clear() -> None:
+    CACHE.clear()
@@ -0,0 +1,167 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Opt-in timings and counters of the costly parts of a build.
+
+With ``os_api_ref_profile = True`` the functions decorated with
+:func:`timed` record their calls and cumulative time, and the caches
+their hits and misses with :func:`count`. The records are kept in a
+module dict, and moved into the build environment under the name of
+the document being read after each document, and under ``''`` for the
+ones of the main process. That way the records of the documents read
+by ``-j N`` worker processes come back to the main process with their
+environment, and are picked in ``env-merge-info`` like any other data
+sphinx keeps by document.
+
+A summary is logged when the build finishes, and written to
+``os_api_ref_profile.json`` in the output directory.
+"""
+
+from collections.abc import Callable
+import functools
+import json
+import os
+import time
+from typing import ParamSpec
+from typing import TypeVar
+
+from docutils import nodes
+from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.environment import BuildEnvironment
+from sphinx.util import logging
+
+LOG = logging.getLogger(__name__)
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+# name -> [calls, seconds]
+Stats = dict[str, list[float]]
+
+ENABLED = False
+# The records made since the last flush.
+STATS: Stats = {}
+
+PROFILE_FILE = 'os_api_ref_profile.json'
+
+
+def count(name: str, calls: int = 1) -> None:
+    """Count calls of name, e.g. a cache hit."""
+    if ENABLED:
+        STATS.setdefault(name, [0, 0.0])[0] += calls
+
+
+def timed(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Record the calls and cumulative time of the decorated function."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record = STATS.setdefault(name, [0, 0.0])
+                record[0] += 1
+                record[1] += time.perf_counter() - start
+
+        return wrapper
+
+    return decorator
+
+
+def merge(stats: Stats, other: Stats) -> None:
+    for name, (calls, seconds) in other.items():
+        record = stats.setdefault(name, [0, 0.0])
+        record[0] += calls
+        record[1] += seconds
+
+
+def env_stats(env: BuildEnvironment) -> dict[str, Stats]:
+    """Return the records of the build, by docname."""
+    if not hasattr(env, 'os_api_ref_profile'):
+        env.os_api_ref_profile = {}  # type: ignore[attr-defined]
+    return env.os_api_ref_profile  # type: ignore[attr-defined,no-any-return]
+
+
+def enable(app: Sphinx, config: Config) -> None:
+    global ENABLED
+    ENABLED = bool(config.os_api_ref_profile)
+    STATS.clear()
+
+
+def reset(app: Sphinx, env: BuildEnvironment, docnames: list[str]) -> None:
+    # The records of an earlier build come back with a pickled
+    # environment.
+    if ENABLED:
+        env.os_api_ref_profile = {}  # type: ignore[attr-defined]
+
+
+def flush(app: Sphinx, docname: str) -> None:
+    """Move the records made so far into the environment."""
+    if ENABLED and STATS:
+        merge(env_stats(app.env).setdefault(docname, {}), STATS)
+        STATS.clear()
+
+
+def flush_main(app: Sphinx, *args: object) -> None:
+    # Called before the worker processes are forked, so they don't
+    # start with the records of the main process.
+    flush(app, '')
+
+
+def flush_doc(app: Sphinx, doctree: nodes.document) -> None:
+    flush(app, app.env.docname)
+
+
+def merge_info(
+    app: Sphinx,
+    env: BuildEnvironment,
+    docnames: list[str],
+    other: BuildEnvironment,
+) -> None:
+    if ENABLED:
+        stats = env_stats(env)
+        other_stats = env_stats(other)
+        for docname in docnames:
+            if docname in other_stats:
+                stats[docname] = other_stats[docname]
+
+
+def summary(stats: Stats) -> str:
+    lines = [f"{'os-api-ref profile':40s} {'calls':>8s} {'time':>10s}"]
+    for name, (calls, seconds) in sorted(
+        stats.items(), key=lambda item: (-item[1][1], item[0])
+    ):
+        time_col = f"{seconds:9.3f}s" if seconds else ''
+        lines.append(f"{name:40s} {int(calls):8d} {time_col:>10s}")
+    return '\n'.join(lines)
+
+
+def report(app: Sphinx, exception: Exception | None) -> None:
+    if not ENABLED or exception is not None:
+        return
+    flush(app, '')
+    stats: Stats = {}
+    for doc_stats in env_stats(app.env).values():
+        merge(stats, doc_stats)
+    LOG.info(summary(stats))
+    data = {
+        name: {'calls': int(calls), 'time': seconds}
+        for name, (calls, seconds) in sorted(stats.items())
+    }
+    with open(os.path.join(app.outdir, PROFILE_FILE), 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
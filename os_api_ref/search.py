@@ -0,0 +1,95 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Search index of the methods, for the search box of the pages.
+
+The sphinx search doesn't know about rest_method, so the build writes
+its own index of the methods in ``_static/api-search-index.js``, made
+from the API model. The pages only load it once the search box is
+used.
+
+Each method is listed as ``[page, target, method, url, title,
+parameters]`` with page an index in the list of pages, and every
+trigram of the lowercased ``method url title parameters`` text maps to
+the sorted numbers of the methods it is in, stored as the differences
+between consecutive numbers to keep the file small. The search box
+intersects the lists of the trigrams of the query, shortest first, then
+checks the few methods left actually match.
+"""
+
+import json
+import os
+from typing import Any
+
+from sphinx.application import Sphinx
+
+from os_api_ref import bundle
+from os_api_ref import model
+
+SEARCH_INDEX = os.path.join('_static', 'api-search-index.js')
+
+BUILDERS = ('html', 'readthedocs', 'readthedocssinglehtmllocalmedia')
+
+
+def search_text(entry: list[Any]) -> str:
+    """Return the text of an entry searched by the browser."""
+    return ' '.join(entry[2:]).lower()
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def build_index(app: Sphinx) -> dict[str, Any]:
+    pages: list[str] = []
+    page_numbers: dict[str, int] = {}
+    entries: list[list[Any]] = []
+    grams: dict[str, list[int]] = {}
+    for method in model.methods(app.env):
+        docname = method['docname']
+        if docname not in page_numbers:
+            page_numbers[docname] = len(pages)
+            pages.append(app.builder.get_target_uri(docname))
+        params = dict.fromkeys(param['name'] for param in method['parameters'])
+        entry = [
+            page_numbers[docname],
+            method['target'],
+            method['method'],
+            method['url'],
+            method['title'],
+            ' '.join(params),
+        ]
+        # The entries are numbered in order, so the lists are sorted.
+        for gram in trigrams(search_text(entry)):
+            grams.setdefault(gram, []).append(len(entries))
+        entries.append(entry)
+    for numbers in grams.values():
+        for i in range(len(numbers) - 1, 0, -1):
+            numbers[i] -= numbers[i - 1]
+    return {'pages': pages, 'entries': entries, 'grams': grams}
+
+
+def write_search_index(app: Sphinx, exception: Exception | None) -> None:
+    if app.builder.name not in BUILDERS or exception:
+        return
+    index = build_index(app)
+    if not index['entries']:
+        return
+    data = json.dumps(
+        index, separators=(',', ':'), ensure_ascii=False, sort_keys=True
+    )
+    content = f'window.osApiRefSearchIndex = {data};\n'.encode()
+    path = os.path.join(app.builder.outdir, SEARCH_INDEX)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bundle.write_if_changed(path, content)
+    for suffix, variant in bundle.compress(content).items():
+        bundle.write_if_changed(path + suffix, variant)
@@ -17,8 +17,18 @@ test_os_api_ref
 Tests for `os_api_ref` module.
 """
 
+import json
+import os
+
 from bs4 import BeautifulSoup
 
+import os_api_ref
+from os_api_ref import bundle
+from os_api_ref import http_codes
+from os_api_ref import model
+from os_api_ref import parse_cache
+from os_api_ref import profile
+from os_api_ref import search
 from os_api_ref.tests import base
 
 
@@ -39,6 +49,9 @@ class TestBasicExample(base.TestCase):
         self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
         self.soup = BeautifulSoup(self.html, 'html.parser')
         self.content = str(self.soup)
+        self.search_index = (
+            app.outdir / '_static' / 'api-search-index.js'
+        ).read_text(encoding='utf-8')
 
     def test_expand_all(self):
         """Do we get an expand all button like we expect."""
@@ -63,7 +76,7 @@ class TestBasicExample(base.TestCase):
             (
                 '<button class="btn btn-info btn-sm btn-detail" '
                 'data-bs-target="#list-servers-detail" data-bs-toggle="collapse" '  # noqa: E501
-                'id="list-servers-detail-btn">detail</button>'
+                'data-ordinal="0" id="list-servers-detail-btn">detail</button>'
             ),
             str(content),
         )
@@ -138,3 +151,347 @@ class TestBasicExample(base.TestCase):
 
         self.assertIn(success_table, self.content)
         self.assertIn(error_table, self.content)
+
+    def test_details_not_lazy(self):
+        self.assertIsNone(self.soup.find('template'))
+
+    def test_model(self):
+        methods = list(model.methods(self.app.env))
+        self.assertEqual(1, len(methods))
+        method = methods[0]
+        self.assertEqual(
+            ('index', 'list-servers', 'GET', '/servers', 'List Servers'),
+            (
+                method['docname'],
+                method['target'],
+                method['method'],
+                method['url'],
+                method['title'],
+            ),
+        )
+        self.assertEqual(
+            [
+                {
+                    'name': 'name',
+                    'ref': 'name',
+                    'in': 'body',
+                    'type': 'string',
+                    'required': True,
+                    'description': 'The name of things\n',
+                    'min_version': None,
+                    'max_version': None,
+                }
+            ],
+            method['parameters'],
+        )
+        codes = [
+            (status['kind'], status['code'], status['reason'])
+            for status in method['status_codes']
+        ]
+        self.assertEqual(('success', 200, 'default'), codes[0])
+        self.assertEqual(('error', 409, 'duplcate_zone'), codes[-1])
+        self.assertEqual(9, len(codes))
+
+    def test_model_purged(self):
+        model.purge_doc(self.app, self.app.env, 'index')
+        self.assertEqual([], list(model.methods(self.app.env)))
+
+    def test_search_box(self):
+        search = self.soup.find(id='api-search')
+        assert search is not None
+        self.assertEqual('./', search['data-root'])
+        self.assertEqual('index.html', search['data-page'])
+
+    def test_search_index(self):
+        content = self.search_index
+        prefix = 'window.osApiRefSearchIndex = '
+        self.assertTrue(content.startswith(prefix))
+        index = json.loads(content[len(prefix) :].rstrip().rstrip(';'))
+        self.assertEqual(['index.html'], index['pages'])
+        self.assertEqual(
+            [[0, 'list-servers', 'GET', '/servers', 'List Servers', 'name']],
+            index['entries'],
+        )
+        self.assertEqual([0], index['grams']['ser'])
+        self.assertNotIn('xyz', index['grams'])
+
+    def test_status_reasons_cached(self):
+        reasons = {
+            key[2:]
+            for key in parse_cache.CACHE
+            if isinstance(key, tuple) and key[0] == 'status'
+        }
+        self.assertIn((405, 'default'), reasons)
+        self.assertIn((409, 'duplcate_zone'), reasons)
+
+
+class TestSearchBoxNotIndexed(base.TestCase):
+    """Test there is no search box where no search index is written."""
+
+    @base.with_app(buildername='dirhtml', srcdir=base.example_dir('basic'))
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.index_written = (app.outdir / search.SEARCH_INDEX).exists()
+
+    def test_no_search_box(self):
+        self.assertFalse(self.index_written)
+        self.assertNotIn('id="api-search"', self.html)
+        self.assertIn('id="expand-all"', self.html)
+
+
+class TestExtraHttpCodes(base.TestCase):
+    """Test the extra HTTP codes from the configuration are used."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('basic'),
+        confoverrides={
+            'os_api_ref_extra_http_codes': {409: 'Duplicate', 'x': 'Bad'}
+        },
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.warning = warning.getvalue()
+
+    def test_extra_code(self):
+        self.assertIn('<code>409 - Duplicate</code>', self.html)
+        self.assertIn('<code>405 - Method Not Allowed</code>', self.html)
+
+    def test_invalid_code(self):
+        self.assertIn(
+            'Invalid HTTP code in os_api_ref_extra_http_codes: x',
+            self.warning,
+        )
+
+    def test_builtin_codes_unchanged(self):
+        self.assertEqual('Conflict', http_codes.HTTP_CODES[409])
+        self.assertEqual('Duplicate', http_codes.CODES[409])
+
+    def test_directive_codes(self):
+        codes = http_codes.HTTPResponseCodeDirective.CODES
+        self.assertIs(http_codes.CODES, codes)
+        self.assertEqual('Duplicate', codes[409])
+
+
+class TestLazyDetails(base.TestCase):
+    """Test the details are left out of the DOM in the lazy mode."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('basic'),
+        confoverrides={'os_api_ref_lazy_details': True},
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+        self.soup = BeautifulSoup(self.html, 'html.parser')
+
+    def test_details_in_template(self):
+        sections = self.soup.find_all(class_='api-detail')
+        self.assertNotEqual([], sections)
+        for section in sections:
+            children = section.find_all(recursive=False)
+            self.assertEqual(1, len(children))
+            self.assertEqual('template', children[0].name)
+            self.assertEqual(['api-detail-lazy'], children[0]['class'])
+            self.assertIsNotNone(children[0].find('table'))
+
+    def test_method_not_lazy(self):
+        methods = self.soup.find_all(class_='operation-grp')
+        self.assertNotEqual([], methods)
+        for method in methods:
+            self.assertIsNone(method.find_parent('template'))
+
+
+class TestParallelPreload(base.TestCase):
+    """Test the yaml files are loaded before a parallel read."""
+
+    @base.with_app(
+        buildername='html', srcdir=base.example_dir('basic'), parallel=2
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        self.app = app
+        (app.srcdir / 'empty.yaml').write_text('')
+        (app.srcdir / 'empty.rst').write_text(
+            '.. rest_parameters:: empty.yaml\n'
+        )
+        os_api_ref.preload_yaml_files(app, app.env, ['index', 'empty'])
+        self.empty = str(app.srcdir / 'empty.yaml')
+        # What a forked reader does with the file.
+        self.lookup = os_api_ref.load_param_file(app.env, self.empty, 'empty')
+        self.warning = warning.getvalue()
+
+    def test_caches_warmed(self):
+        self.assertIn(
+            str(self.app.srcdir / 'parameters.yaml'), os_api_ref.YAML_CACHE
+        )
+        self.assertIn(
+            str(self.app.srcdir / 'status.yaml'),
+            http_codes.HTTP_YAML_CACHE,
+        )
+
+    def test_empty_file_reported_once(self):
+        self.assertIsNone(self.lookup)
+        self.assertIsNone(os_api_ref.YAML_CACHE[self.empty][1])
+        self.assertEqual(1, self.warning.count('Parameters file is empty'))
+
+
+class TestProfile(base.TestCase):
+    """Test the timings are recorded when os_api_ref_profile is set."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('basic'),
+        confoverrides={'os_api_ref_profile': True},
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        self.status = status.getvalue()
+        with open(app.outdir / profile.PROFILE_FILE) as f:
+            self.data = json.load(f)
+        self.addCleanup(setattr, profile, 'ENABLED', False)
+
+    def test_json(self):
+        self.assertEqual(1, self.data['resolve_rest_references']['calls'])
+        self.assertEqual(1, self.data['rest_parameters.collect_rows']['calls'])
+        self.assertEqual(2, self.data['rest_status_code._load_codes']['calls'])
+        self.assertGreater(self.data['load_param_file']['time'], 0)
+
+    def test_summary(self):
+        self.assertIn('os-api-ref profile', self.status)
+        self.assertIn('rest_status_code.collect_rows', self.status)
+
+
+class TestExport(base.TestCase):
+    """Test the API index and OpenAPI document are written."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('basic'),
+        confoverrides={
+            'os_api_ref_api_index': 'api-index.json',
+            'os_api_ref_openapi': 'openapi.json',
+        },
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        with open(app.outdir / 'api-index.json') as f:
+            self.index = json.load(f)
+        with open(app.outdir / 'openapi.json') as f:
+            self.openapi = json.load(f)
+
+    def test_api_index(self):
+        self.assertEqual(1, self.index['format'])
+        (method,) = self.index['methods']
+        self.assertEqual('GET', method['method'])
+        self.assertEqual('/servers', method['url'])
+        self.assertEqual('index.html#list-servers', method['uri'])
+        self.assertEqual(
+            ['name'], [param['name'] for param in method['parameters']['body']]
+        )
+        self.assertEqual([], method['parameters']['path'])
+        self.assertEqual(
+            [200, 100, 201],
+            [status['code'] for status in method['status_codes']['success']],
+        )
+        conflict = method['status_codes']['error'][-1]
+        self.assertEqual('Conflict', conflict['title'])
+        self.assertEqual(
+            'There is already a zone with this name.\n',
+            conflict['description'],
+        )
+
+    def test_openapi(self):
+        self.assertEqual('3.0.3', self.openapi['openapi'])
+        operation = self.openapi['paths']['/servers']['get']
+        self.assertEqual('List Servers', operation['summary'])
+        self.assertEqual('list-servers', operation['operationId'])
+        self.assertNotIn('parameters', operation)
+        self.assertEqual(
+            'Method is not valid for this endpoint.',
+            operation['responses']['405']['description'],
+        )
+
+
+class TestIncrementalBuild(base.TestCase):
+    """Test documents are rebuilt when only the yaml files change."""
+
+    @base.with_app(buildername='html', srcdir=base.example_dir('basic'))
+    def setUp(self, app, status, warning):
+        super().setUp()
+        self.app = app
+        self.app.build()
+        self._change('parameters.yaml', 'The name of things', 'Renamed')
+        self._change('status.yaml', 'Request was successful.', 'All good.')
+        self.app.build()
+        self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+
+    def _change(self, fname, old, new):
+        fpath = self.app.srcdir / fname
+        fpath.write_text(fpath.read_text().replace(old, new))
+        # make sure the mtime moves on, even on coarse grained
+        # filesystems.
+        st = os.stat(fpath)
+        os.utime(fpath, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def test_parameters_changed(self):
+        self.assertIn('<p>Renamed</p>', self.html)
+
+    def test_status_changed(self):
+        self.assertIn('<p>All good.</p>', self.html)
+
+
+class TestCopyAssets(base.TestCase):
+    """Test unchanged assets are not copied again."""
+
+    @base.with_app(buildername='html', srcdir=base.example_dir('basic'))
+    def setUp(self, app, status, warning):
+        super().setUp()
+        self.app = app
+        self.app.build()
+        self.first = status.getvalue()
+        status.truncate(0)
+        status.seek(0)
+        self.app.build()
+        self.second = status.getvalue()
+
+    def test_first_build_copies(self):
+        self.assertIn('Copying assets: ', self.first)
+        self.assertIn('api-site.css, api-site.js', self.first)
+
+    def test_second_build_skips(self):
+        # css and js, the two fonts, and the bundle with its
+        # precompressed variants.
+        expected = 4 + 2 * (1 + len(bundle.compress(b'')))
+        self.assertNotIn('Copying assets', self.second)
+        self.assertIn(f'Skipped {expected} unchanged assets', self.second)
+
+
+class TestBundle(base.TestCase):
+    """Test the pages use the minified, fingerprinted assets."""
+
+    @base.with_app(buildername='html', srcdir=base.example_dir('basic'))
+    def setUp(self, app, status, warning):
+        super().setUp()
+        app.build()
+        self.static = os.listdir(app.outdir / '_static')
+        self.html = (app.outdir / 'index.html').read_text(encoding='utf-8')
+
+    def test_fingerprinted_assets(self):
+        for name in ('api-site.css', 'api-site.js'):
+            hashed = bundle.build()[name][0]
+            self.assertNotEqual(name, hashed)
+            self.assertIn(f'_static/{hashed}', self.html)
+            self.assertNotIn(f'_static/{name}', self.html)
+            self.assertIn(hashed, self.static)
+            self.assertIn(hashed + '.gz', self.static)
+            # kept for anything linking to them directly
+            self.assertIn(name, self.static)
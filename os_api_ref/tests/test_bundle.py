@@ -0,0 +1,138 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_bundle
+----------------------------------
+
+Tests for the minified asset bundle.
+"""
+
+import gzip
+import os
+
+import fixtures
+
+from os_api_ref import bundle
+from os_api_ref.tests import base
+
+
+class TestMinify(base.TestCase):
+    def test_css(self):
+        css = (
+            '/* a comment */\n'
+            '.docs-body .section h1 ,\n'
+            'a:hover {\n'
+            '    margin: 0 auto;\n'
+            '    color: red;\n'
+            '}\n'
+            '@media (min-width: 768px) {\n'
+            '  .x { display: none; }\n'
+            '}\n'
+        )
+        self.assertEqual(
+            '.docs-body .section h1,a:hover{margin: 0 auto;color: red}'
+            '@media (min-width: 768px){.x{display: none}}\n',
+            bundle.minify_css(css),
+        )
+
+    def test_js(self):
+        js = (
+            '// leading comment\n'
+            'function f() {\n'
+            '    /**\n'
+            '     * block comment\n'
+            '     */\n'
+            '    var url = "http://example.com"  // kept\n'
+            '\n'
+            '    return url\n'
+            '}\n'
+        )
+        self.assertEqual(
+            'function f() {\nvar url = "http://example.com"\nreturn url\n}\n',
+            bundle.minify_js(js),
+        )
+
+    def test_css_strings(self):
+        css = (
+            '.a::before { content: "/* not a comment */  { x }"; }\n'
+            ".b { background: url(img/a//b.png) ; font-family: 'A  B'; }\n"
+            '.c /* a comment */ { color: red }\n'
+        )
+        self.assertEqual(
+            '.a::before{content: "/* not a comment */  { x }"}'
+            ".b{background: url(img/a//b.png);font-family: 'A  B'}"
+            '.c{color: red}\n',
+            bundle.minify_css(css),
+        )
+
+    def test_js_strings(self):
+        js = (
+            'var a = "/* x */", b = \'//\';  // trailing\n'
+            'var c = /\\/\\*[/*]/g, d = x / 2 / y;\n'
+            '/* before */ f(a, `\n'
+            '  // in a template\n'
+            '`);\n'
+            'g(); /* a\n'
+            '   b */ h();\n'
+            'return /* c */ 1;\n'
+        )
+        self.assertEqual(
+            'var a = "/* x */", b = \'//\';\n'
+            'var c = /\\/\\*[/*]/g, d = x / 2 / y;\n'
+            'f(a, `\n'
+            '  // in a template\n'
+            '`);\n'
+            'g();\n'
+            'h();\n'
+            'return   1;\n',
+            bundle.minify_js(js),
+        )
+
+    def test_assets_shrink(self):
+        for name, (hashed, content) in bundle.build().items():
+            with open(os.path.join(bundle.ASSETS_DIR, name), 'rb') as f:
+                original = f.read()
+            self.assertLess(len(content), len(original))
+            self.assertEqual(bundle.fingerprint(name, content), hashed)
+
+
+class TestWrite(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = self.useFixture(fixtures.TempDir()).path
+
+    def test_write(self):
+        stale = os.path.join(self.static, 'api-site.0123456789ab.js.gz')
+        open(stale, 'wb').close()
+
+        written, unchanged = bundle.write(self.static)
+        self.assertEqual({}, unchanged)
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(sorted(written), sorted(os.listdir(self.static)))
+
+        hashed, content = bundle.build()['api-site.js']
+        with gzip.open(os.path.join(self.static, hashed + '.gz')) as f:
+            self.assertEqual(content, f.read())
+
+        written, unchanged = bundle.write(self.static)
+        self.assertEqual([], written)
+        self.assertEqual(sorted(os.listdir(self.static)), sorted(unchanged))
+
+    def test_write_keeps_other_files(self):
+        names = ('api-site.custom.css', 'api-site.custom.css.gz')
+        for name in names:
+            open(os.path.join(self.static, name), 'wb').close()
+
+        bundle.write(self.static)
+        for name in names:
+            self.assertTrue(os.path.exists(os.path.join(self.static, name)))
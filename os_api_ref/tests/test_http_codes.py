@@ -0,0 +1,111 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_http_codes
+----------------------------------
+
+Tests for the loading of status code files.
+"""
+
+import os
+
+import fixtures
+
+from os_api_ref import http_codes
+from os_api_ref.tests import base
+
+
+class TestLoadStatusFile(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.warning = self.useFixture(
+            fixtures.MockPatchObject(http_codes.LOG, 'warning')
+        ).mock
+
+    def _load(self, content):
+        fpath = os.path.join(self.tmpdir, 'status.yaml')
+        with open(fpath, 'w') as f:
+            f.write(content)
+        self.addCleanup(http_codes.HTTP_YAML_CACHE.pop, fpath, None)
+        return fpath, http_codes.load_status_file(fpath)
+
+    def _warnings(self):
+        return [
+            (call.kwargs['location'], call.args[0] % call.args[1:])
+            for call in self.warning.call_args_list
+        ]
+
+    def test_index(self):
+        _, index = self._load(
+            "200:\n"
+            "  default: |\n"
+            "    Request was successful.\n"
+            "409:\n"
+            "  default: Conflict.\n"
+            "  duplicate_zone: Duplicate.\n"
+        )
+        self.assertEqual(
+            {
+                (200, 'default'): 'Request was successful.\n',
+                (409, 'default'): 'Conflict.',
+                (409, 'duplicate_zone'): 'Duplicate.',
+            },
+            index,
+        )
+        self.assertEqual([], self._warnings())
+
+    def test_all_problems_reported(self):
+        fpath, index = self._load(
+            "200:\n"
+            "  default: OK.\n"
+            "abc:\n"
+            "  default: Not a code.\n"
+            "404:\n"
+            "  gone: Gone.\n"
+            "500:\n"
+            "  default:\n"
+            "    - not text\n"
+        )
+        self.assertEqual(
+            {(200, 'default'): 'OK.', (404, 'gone'): 'Gone.'}, index
+        )
+        self.assertEqual(
+            [
+                (f"{fpath}:3", "status code abc is not a number"),
+                (f"{fpath}:5", "status code 404 has no default reason"),
+                (f"{fpath}:9", "reason default of 500 is not text"),
+                (f"{fpath}:7", "status code 500 has no default reason"),
+            ],
+            self._warnings(),
+        )
+
+    def test_not_a_mapping(self):
+        fpath, index = self._load("- 200\n")
+        self.assertEqual({}, index)
+        self.assertEqual(
+            [(f"{fpath}:1", "expected a mapping of status codes")],
+            self._warnings(),
+        )
+
+    def test_empty(self):
+        fpath, index = self._load("# nothing yet\n")
+        self.assertEqual({}, index)
+        self.assertEqual(
+            [(f"{fpath}:1", "no status codes defined")], self._warnings()
+        )
+
+    def test_checked_once(self):
+        fpath, index = self._load("404:\n  gone: Gone.\n")
+        self.assertIs(index, http_codes.load_status_file(fpath))
+        self.assertEqual(1, self.warning.call_count)
@@ -17,7 +17,10 @@ test_os_api_ref
 Tests for `os_api_ref` module.
 """
 
+import json
+
 from bs4 import BeautifulSoup
+from sphinx.errors import ExtensionError
 
 from os_api_ref.tests import base
 
@@ -74,14 +77,14 @@ class TestMicroversions(base.TestCase):
 <td><p>string</p></td>
 <td><p>The name of things</p></td>
 </tr>
-<tr class="rp_min_ver_2_11 row-odd"><td><p>name2</p></td>
+<tr class="rp_min_ver_2_11 row-odd" id="mv-0"><td><p>name2</p></td>
 <td><p>body</p></td>
 <td><p>string</p></td>
 <td><p>The name of things</p>
 <p><strong>New in version 2.11</strong></p>
 </td>
 </tr>
-<tr class="rp_max_ver_2_20 row-even"><td><p>name3</p></td>
+<tr class="rp_max_ver_2_20 row-even" id="mv-1"><td><p>name3</p></td>
 <td><p>body</p></td>
 <td><p>string</p></td>
 <td><p>The name of things</p>
@@ -97,6 +100,190 @@ class TestMicroversions(base.TestCase):
         button_selectors = '<option selected="selected" value="">All</option><option value="2.1">2.1</option><option value="2.2">2.2</option><option value="2.3">2.3</option><option value="2.4">2.4</option><option value="2.5">2.5</option><option value="2.6">2.6</option><option value="2.7">2.7</option><option value="2.8">2.8</option><option value="2.9">2.9</option><option value="2.10">2.10</option><option value="2.11">2.11</option><option value="2.12">2.12</option><option value="2.13">2.13</option><option value="2.14">2.14</option><option value="2.15">2.15</option><option value="2.16">2.16</option><option value="2.17">2.17</option><option value="2.18">2.18</option><option value="2.19">2.19</option><option value="2.20">2.20</option><option value="2.21">2.21</option><option value="2.22">2.22</option><option value="2.23">2.23</option><option value="2.24">2.24</option><option value="2.25">2.25</option><option value="2.26">2.26</option><option value="2.27">2.27</option><option value="2.28">2.28</option><option value="2.29">2.29</option><option value="2.30">2.30</option>'  # noqa
         self.assertIn(button_selectors, self.content)
 
+    def test_mv_index(self):
+        """Test the selector gets the microversions of the page"""
+        script = self.soup.find('script', id='mv-index')
+        assert script is not None and script.string is not None
+        self.assertEqual('application/json', script['type'])
+        index = json.loads(script.string)
+        self.assertEqual(
+            {
+                'mv-0': ['2.11', None],
+                'mv-1': [None, '2.20'],
+                'list-tags-operation': ['2.17', '2.19'],
+            },
+            index,
+        )
+        for elem_id in index:
+            self.assertIsNotNone(self.soup.find(id=elem_id))
+
+    def test_ordinals(self):
+        """Test the methods are numbered in document order"""
+        self.assertEqual(
+            [('#list-servers-detail', '0'), ('#list-tags-detail', '1')],
+            [
+                (button['data-bs-target'], button['data-ordinal'])
+                for button in self.soup.find_all(class_='btn-detail')
+            ],
+        )
+
     def test_js_declares(self):
         self.assertIn("os_max_mv = 30;", self.content)
         self.assertIn("os_min_mv = 1;", self.content)
+
+
+class TestMicroversionPages(base.TestCase):
+    """Test the pages rendered for a single microversion."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('microversions'),
+        confoverrides={
+            'os_api_ref_render_microversions': ['2.1', '2.18', 'latest'],
+        },
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+        # A handle_page set on the builder itself, e.g. by a theme.
+        self.handled: list[str] = []
+        handle_page = app.builder.handle_page
+
+        def own_handle_page(pagename, *args, **kwargs):
+            self.handled.append(pagename)
+            handle_page(pagename, *args, **kwargs)
+
+        app.builder.handle_page = own_handle_page
+        app.build()
+        self.own_handle_page_kept = app.builder.handle_page is own_handle_page
+        self.warning = warning.getvalue()
+        self.soups = {
+            name: BeautifulSoup(
+                (app.outdir / f'{name}.html').read_text(encoding='utf-8'),
+                'html.parser',
+            )
+            for name in ('index', 'index.2.1', 'index.2.18', 'index.latest')
+        }
+
+    def _names(self, page):
+        return [
+            row.find_all('td')[0].get_text()
+            for row in self.soups[page].select('tbody > tr')
+        ]
+
+    def test_no_warnings(self):
+        self.assertEqual('', self.warning)
+
+    def test_rows_filtered(self):
+        self.assertEqual(['name', 'name2', 'name3'], self._names('index'))
+        self.assertEqual(['name', 'name3'], self._names('index.2.1'))
+        self.assertEqual(['name', 'name2', 'name3'], self._names('index.2.18'))
+        self.assertEqual(['name', 'name2'], self._names('index.latest'))
+
+    def test_methods_filtered(self):
+        for page, present in (
+            ('index', True),
+            ('index.2.1', False),
+            ('index.2.18', True),
+            ('index.latest', False),
+        ):
+            soup = self.soups[page]
+            for elem_id in ('list-tags', 'list-tags-detail'):
+                self.assertEqual(
+                    present, soup.find(id=elem_id) is not None, page
+                )
+            self.assertIsNotNone(soup.find(id='list-servers-detail'))
+
+    def test_own_handle_page_kept(self):
+        self.assertTrue(self.own_handle_page_kept)
+        for page in ('index', 'index.2.1', 'index.2.18', 'index.latest'):
+            self.assertEqual(1, self.handled.count(page))
+
+    def test_toc_filtered(self):
+        for page, present in (('index', True), ('index.2.1', False)):
+            links = self.soups[page].select('a.reference.internal')
+            self.assertEqual(
+                present,
+                '#list-tags' in [link['href'] for link in links],
+                page,
+            )
+
+    def test_same_page_when_nothing_filtered(self):
+        # Nothing is out of the range of 2.18, its page only differs from
+        # the complete one by the selector.
+        metas = []
+        bodies = []
+        for page in ('index', 'index.2.18'):
+            soup = self.soups[page]
+            body = soup.find(class_='docs-body')
+            assert soup.head is not None and body is not None
+            metas.append(soup.head.find_all('meta'))
+            for elem in body.find_all(['select', 'script']):
+                elem.decompose()
+            bodies.append(str(body).split())
+        self.assertEqual(metas[0], metas[1])
+        self.assertEqual(bodies[0], bodies[1])
+
+    def test_selector_links(self):
+        links = {
+            option['value']: option.get('data-href')
+            for option in self.soups['index'].find_all('option')
+        }
+        self.assertEqual('index.2.1.html', links['2.1'])
+        self.assertEqual('index.2.18.html', links['2.18'])
+        self.assertEqual('index.latest.html', links['2.30'])
+        self.assertIsNone(links['2.2'])
+
+    def test_variant_selector(self):
+        options = self.soups['index.2.18'].find_all('option')
+        self.assertEqual(
+            [
+                ('', 'index.html'),
+                ('2.1', 'index.2.1.html'),
+                ('2.18', 'index.2.18.html'),
+                ('2.30', 'index.latest.html'),
+            ],
+            [(option['value'], option['data-href']) for option in options],
+        )
+        selected = [
+            option['value'] for option in options if option.get('selected')
+        ]
+        self.assertEqual(['2.18'], selected)
+        self.assertIsNone(self.soups['index.2.18'].find(id='mv-index'))
+
+
+class TestMicroversionPagesRebuild(base.TestCase):
+    """Test a build doesn't render the pages of an interrupted one."""
+
+    @base.with_app(
+        buildername='html',
+        srcdir=base.example_dir('microversions'),
+        confoverrides={'os_api_ref_render_microversions': ['2.1']},
+    )
+    def setUp(self, app, status, warning):
+        super().setUp()
+
+        def interrupt(app):
+            raise RuntimeError('interrupted')
+
+        # Stop the build after the documents are written, before the
+        # microversion pages are rendered.
+        app.connect('html-collect-pages', interrupt, priority=100)
+        self.assertRaises(ExtensionError, app.build)
+
+        # The basic example has no microversions, so no pages of its own.
+        @base.with_app(
+            buildername='html',
+            srcdir=base.example_dir('basic'),
+            confoverrides={'os_api_ref_render_microversions': ['2.1']},
+        )
+        def build_again(app, status, warning):
+            app.build()
+            self.pages = sorted(
+                path.name for path in app.outdir.glob('*.html')
+            )
+
+        build_again()
+
+    def test_no_stale_pages(self):
+        self.assertNotIn('index.2.1.html', self.pages)
+        self.assertIn('index.html', self.pages)
@@ -17,9 +17,221 @@ test_os_api_ref
 Tests for `os_api_ref` module.
 """
 
+from collections import OrderedDict
+import types
+from typing import Any
+
+from docutils import nodes
+import fixtures
+import yaml
+
+import os_api_ref
+from os_api_ref import export
+from os_api_ref import profile
+from os_api_ref import search
 from os_api_ref.tests import base
 
 
 class TestOs_api_ref(base.TestCase):
     def test_something(self):
         pass
+
+
+class TestOrderedLoad(base.TestCase):
+    def test_ordered(self):
+        data = os_api_ref.ordered_load("b:\n  y: 1\n  x: 2\na: 3\n")
+        self.assertIsInstance(data, OrderedDict)
+        self.assertIsInstance(data['b'], OrderedDict)
+        self.assertEqual(['b', 'a'], list(data))
+        self.assertEqual(['y', 'x'], list(data['b']))
+
+    def test_floats_are_strings(self):
+        data = os_api_ref.ordered_load(
+            "name:\n  min_version: 2.20\n  max_version: 2.2\n"
+        )
+        self.assertEqual('2.20', data['name']['min_version'])
+        self.assertEqual('2.2', data['name']['max_version'])
+
+    def test_uses_libyaml(self):
+        if not yaml.__with_libyaml__:
+            self.skipTest('libyaml is not available')
+        self.assertTrue(issubclass(os_api_ref.OrderedLoader, yaml.CSafeLoader))
+
+
+class TestParseParamList(base.TestCase):
+    def assertSameAsYaml(self, text):
+        lines = text.split('\n')
+        self.assertEqual(
+            yaml.safe_load(text), os_api_ref.parse_param_list(lines)
+        )
+
+    def test_simple(self):
+        self.assertEqual(
+            [{'name': 'server_name'}, {'os-ext:id': 'ext_id'}],
+            os_api_ref.parse_param_list(
+                ['- name: server_name', '', '- os-ext:id: ext_id  ']
+            ),
+        )
+
+    def test_same_as_yaml(self):
+        for text in (
+            '- name: ref',
+            '- name: ref\n# comment\n- other: ref2',
+            '- invalid_name',
+            '- name: ref # comment',
+            '- name: "quoted"',
+            '- yes: null',
+            '- version: 2.1',
+            '- count: 10',
+            '- name:\n    ref',
+            'name: ref',
+        ):
+            self.assertSameAsYaml(text)
+
+
+class TestRestMethodHtml(base.TestCase):
+    def _render(self, node):
+        translator: Any = types.SimpleNamespace(body=[])
+        self.assertRaises(
+            nodes.SkipNode, os_api_ref.rest_method_html, translator, node
+        )
+        return ''.join(translator.body)
+
+    def test_render_twice(self):
+        node = os_api_ref.rest_method(
+            method='GET',
+            url='/servers/{server_id}',
+            target='show-server',
+            css_classes='',
+            desc=nodes.Text('Show Server'),
+            ordinal=0,
+        )
+        first = self._render(node)
+        self.assertIn(
+            '/servers/<span class="path_parameter">{server_id}</span>', first
+        )
+        self.assertEqual('/servers/{server_id}', node['url'])
+        self.assertEqual(first, self._render(node))
+
+
+class TestProfile(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.useFixture(fixtures.MockPatchObject(profile, 'ENABLED', True))
+        self.addCleanup(profile.STATS.clear)
+
+    def test_timed(self):
+        @profile.timed('double')
+        def double(value):
+            return value * 2
+
+        self.assertEqual(4, double(2))
+        self.assertEqual(6, double(3))
+        profile.count('double.cache_hit')
+        self.assertEqual(2, profile.STATS['double'][0])
+        self.assertEqual(1, profile.STATS['double.cache_hit'][0])
+
+    def test_merge_info(self):
+        app: Any = types.SimpleNamespace(env=types.SimpleNamespace())
+        # The worker also got a copy of what the main process had.
+        other: Any = types.SimpleNamespace(
+            os_api_ref_profile={
+                '': {'load_param_file': [3, 0.0]},
+                'servers': {'load_param_file': [2, 0.5]},
+            }
+        )
+        profile.count('load_param_file', 3)
+        profile.flush(app, '')
+        self.assertEqual({}, profile.STATS)
+        profile.merge_info(app, app.env, ['servers'], other)
+        self.assertEqual(
+            {
+                '': {'load_param_file': [3, 0.0]},
+                'servers': {'load_param_file': [2, 0.5]},
+            },
+            app.env.os_api_ref_profile,
+        )
+
+
+class TestOpenapi(base.TestCase):
+    def _method(self, docname, **kwargs):
+        method = {
+            'method': 'GET',
+            'url': '/servers/{server_id}',
+            'title': 'Show Server',
+            'docname': docname,
+            'target': 'show-server',
+            'min_version': None,
+            'max_version': None,
+            'parameters': {
+                'path': [
+                    {
+                        'name': 'server_id',
+                        'type': 'uuid',
+                        'required': False,
+                        'description': 'The UUID of the server.',
+                    }
+                ],
+                'query': [],
+            },
+            'status_codes': {'success': [], 'error': []},
+        }
+        method.update(kwargs)
+        return method
+
+    def test_operations(self):
+        index = {
+            'project': 'Compute',
+            'release': '',
+            'methods': [
+                self._method('servers', min_version='2.1'),
+                self._method('servers', method='DELETE'),
+            ],
+        }
+        document = export.openapi(index)
+        self.assertEqual({'title': 'Compute', 'version': ''}, document['info'])
+        get = document['paths']['/servers/{server_id}']['get']
+        self.assertEqual('show-server', get['operationId'])
+        self.assertEqual(
+            {'min_version': '2.1'}, get['x-openstack-microversions']
+        )
+        (param,) = get['parameters']
+        self.assertTrue(param['required'])
+        self.assertEqual({'type': 'string', 'format': 'uuid'}, param['schema'])
+        self.assertEqual({'default': {'description': ''}}, get['responses'])
+        delete = document['paths']['/servers/{server_id}']['delete']
+        self.assertEqual('servers-show-server', delete['operationId'])
+
+
+class TestSearchIndex(base.TestCase):
+    def test_grams_are_deltas(self):
+        methods = {
+            target: {
+                'docname': 'servers',
+                'target': target,
+                'method': 'GET',
+                'url': url,
+                'title': target,
+                'parameters': [{'name': 'server_id'}, {'name': 'server_id'}],
+            }
+            for target, url in (
+                ('a', '/servers'),
+                ('b', '/flavors'),
+                ('c', '/servers/{server_id}'),
+            )
+        }
+        app: Any = types.SimpleNamespace(
+            env=types.SimpleNamespace(os_api_ref_model={'servers': methods}),
+            builder=types.SimpleNamespace(
+                get_target_uri=lambda docname: docname + '.html'
+            ),
+        )
+        index = search.build_index(app)
+        self.assertEqual(['servers.html'], index['pages'])
+        self.assertEqual(
+            [0, 'c', 'GET', '/servers/{server_id}', 'c', 'server_id'],
+            index['entries'][2],
+        )
+        # In the url of a and c, and the parameters of all three.
+        self.assertEqual([0, 2], index['grams']['/se'])
+        self.assertEqual([0, 1, 1], index['grams']['_id'])
@@ -0,0 +1,68 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_parse_cache
+----------------------------------
+
+Tests for the parsed table cell cache.
+"""
+
+from docutils.core import publish_doctree
+from docutils import nodes
+
+from os_api_ref import parse_cache
+from os_api_ref.tests import base
+
+
+def _entry(text):
+    entry = nodes.entry()
+    entry.extend(publish_doctree(text).children)
+    return entry
+
+
+class TestParseCache(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(parse_cache.clear)
+
+    def test_plain_markup_is_cacheable(self):
+        entry = _entry(
+            "The ``id`` of the *server*, see https://example.com\n\n"
+            "- one\n- two\n"
+        )
+        self.assertTrue(parse_cache.cacheable(entry))
+
+    def test_named_reference_is_not_cacheable(self):
+        entry = _entry("See `the docs <https://example.com>`_.")
+        self.assertFalse(parse_cache.cacheable(entry))
+
+    def test_get_returns_copies(self):
+        parse_cache.store('key', _entry("Some *text*."))
+        first = parse_cache.get('key', 'index.rst', 3)
+        second = parse_cache.get('key', 'index.rst', 3)
+        assert first is not None and second is not None
+        self.assertEqual(first.pformat(), second.pformat())
+        self.assertIsNot(first[0], second[0])
+        self.assertIsNone(parse_cache.get('other', 'index.rst', 3))
+
+    def test_get_stamps_location(self):
+        entry = _entry("Some *text*.")
+        for node in entry.findall(nodes.Element):
+            node.source, node.line = 'first.rst', 10
+        parse_cache.store('key', entry)
+        copy = parse_cache.get('key', 'second.rst', 4)
+        assert copy is not None
+        self.assertEqual(
+            {('second.rst', 4)},
+            {(node.source, node.line) for node in copy.findall(nodes.Element)},
+        )
@@ -119,3 +119,13 @@ class TestWarnings(base.TestCase):
             ),
             self.warning,
         )
+
+    def test_path_parameter_in_subsection(self):
+        """A path param repeated in the url is set once, in a subsection."""
+        self.assertNotIn("No path parameter ``server_id``", self.warning)
+
+    def test_path_parameter_not_leaked(self):
+        """Missing path params are only reported for their own method."""
+        self.assertEqual(
+            1, self.warning.count("No path parameter ``b_id`` found")
+        )
@@ -0,0 +1,73 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_yaml_cache
+----------------------------------
+
+Tests for the persistent parameters file cache.
+"""
+
+from collections import OrderedDict
+import os
+
+import fixtures
+
+from os_api_ref import yaml_cache
+from os_api_ref.tests import base
+
+
+class TestYamlCache(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.cache_dir = os.path.join(self.tmpdir, 'doctrees')
+        self.fpath = os.path.join(self.tmpdir, 'parameters.yaml')
+        self.content = b'name:\n  in: body\n'
+        with open(self.fpath, 'wb') as f:
+            f.write(self.content)
+        self.data = OrderedDict(name=OrderedDict([('in', 'body')]))
+        self.warnings = [("Parameters out of order ``%s``", ('name',))]
+
+    def _load(self):
+        result = yaml_cache.load(self.cache_dir, self.fpath)
+        assert result is not None
+        return result
+
+    def test_miss(self):
+        self.assertIsNone(yaml_cache.load(self.cache_dir, self.fpath))
+
+    def test_hit(self):
+        yaml_cache.store(
+            self.cache_dir, self.fpath, self.content, self.data, self.warnings
+        )
+        data, warnings = self._load()
+        self.assertEqual(self.data, data)
+        self.assertIsInstance(data, OrderedDict)
+        self.assertEqual(self.warnings, warnings)
+
+    def test_hit_after_touch(self):
+        yaml_cache.store(
+            self.cache_dir, self.fpath, self.content, self.data, self.warnings
+        )
+        st = os.stat(self.fpath)
+        os.utime(self.fpath, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        data, _ = self._load()
+        self.assertEqual(self.data, data)
+
+    def test_invalidated_on_change(self):
+        yaml_cache.store(
+            self.cache_dir, self.fpath, self.content, self.data, self.warnings
+        )
+        with open(self.fpath, 'wb') as f:
+            f.write(b'name:\n  in: query\n')
+        self.assertIsNone(yaml_cache.load(self.cache_dir, self.fpath))
@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Persistent cache for parsed parameter files.
+
+Parsing a large ``parameters.yaml`` with the pure python yaml loader
+dominates a cold sphinx build of the bigger API references. The
+parsed result (and the warnings raised while checking it) only
+depends on the content of the file, so we store it under the sphinx
+doctree directory and reuse it across builds until the file changes.
+
+Each record is keyed by the absolute path of the file. A record is
+reused as is when the mtime and size of the file are unchanged, and
+after a content hash comparison otherwise (so a ``touch`` of the
+file does not invalidate it).
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any
+
+CACHE_DIRNAME = 'os_api_ref'
+
+# Bump this whenever the shape of what we store changes, so that
+# stale records from an older version are just ignored.
+CACHE_VERSION = 1
+
+# A warning is stored as a logging format string and its arguments,
+# so that it can be replayed exactly as it was emitted the first time.
+CachedWarning = tuple[str, tuple[Any, ...]]
+
+
+def mtime(fpath: str) -> int | None:
+    """Return the mtime of fpath in ns, or None if it can't be read."""
+    try:
+        return os.stat(fpath).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _record_path(cache_dir: str, fpath: str) -> str:
+    name = hashlib.sha1(fpath.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, CACHE_DIRNAME, f'{name}.pickle')
+
+
+def _read_record(path: str) -> dict[str, Any] | None:
+    try:
+        with open(path, 'rb') as stream:
+            record = pickle.load(stream)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+    if not isinstance(record, dict):
+        return None
+    if record.get('version') != CACHE_VERSION:
+        return None
+    return record
+
+
+def _write_record(path: str, record: dict[str, Any]) -> None:
+    # Write to a temporary file first and rename it in place, so
+    # concurrent builds sharing a doctree directory never see a
+    # partial record.
+    dirname = os.path.dirname(path)
+    try:
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as stream:
+            pickle.dump(record, stream, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        # The cache is only an optimization, never fail the build
+        # because of it.
+        pass
+
+
+def load(
+    cache_dir: str, fpath: str, content: bytes | None = None
+) -> tuple[Any, list[CachedWarning]] | None:
+    """Return the cached (data, warnings) for fpath if still valid.
+
+    ``content`` can be passed in when the caller already read the
+    file, otherwise it is only read if the file stat does not match
+    the cached record.
+    """
+    record = _read_record(_record_path(cache_dir, fpath))
+    if record is None or record['path'] != fpath:
+        return None
+
+    st = os.stat(fpath)
+    if record['mtime'] == st.st_mtime_ns and record['size'] == st.st_size:
+        return record['data'], record['warnings']
+
+    if content is None:
+        with open(fpath, 'rb') as stream:
+            content = stream.read()
+    if record['sha256'] != hashlib.sha256(content).hexdigest():
+        return None
+
+    # Same content with a new mtime, remember that so the next build
+    # doesn't need to hash the file again.
+    record['mtime'] = st.st_mtime_ns
+    record['size'] = st.st_size
+    _write_record(_record_path(cache_dir, fpath), record)
+    return record['data'], record['warnings']
+
+
+def store(
+    cache_dir: str,
+    fpath: str,
+    content: bytes,
+    data: Any,
+    warnings: list[CachedWarning],
+) -> None:
+    """Store the parsed data and warnings for fpath."""
+    st = os.stat(fpath)
+    record = {
+        'version': CACHE_VERSION,
+        'path': fpath,
+        'mtime': st.st_mtime_ns,
+        'size': st.st_size,
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'data': data,
+        'warnings': warnings,
+    }
+    _write_record(_record_path(cache_dir, fpath), record)
@@ -0,0 +1,415 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Micro benchmarks for os-api-ref.
+
+Run them through tox, for example::
+
+    tox -e bench -- yaml --entries 10000
+    tox -e bench -- build --methods 500 --params 20 --versions 30 \
+        --json build.json
+"""
+
+import argparse
+import collections
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import platform
+import tempfile
+import time
+import timeit
+
+from docutils import nodes
+from docutils import utils
+import sphinx
+from sphinx.testing.util import SphinxTestApp
+import yaml
+
+import os_api_ref
+from os_api_ref import http_codes
+
+SECTIONS = ('header', 'path', 'query', 'body')
+
+
+def generate_parameters(entries, versions=100):
+    """Return the text of a sorted parameters file with ``entries`` keys."""
+    lines = []
+    for idx in range(entries):
+        section = SECTIONS[idx * len(SECTIONS) // entries]
+        lines.extend(
+            [
+                f'param_{idx:06d}:',
+                '  description: |',
+                f'    The description of parameter {idx}, with some',
+                '    ``rst`` markup and a second line.',
+                f'  in: {section}',
+                f'  min_version: 2.{idx % versions + 1}',
+                f'  required: {"true" if idx % 2 else "false"}',
+                '  type: string',
+            ]
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def generate_method_doctree(methods):
+    """Return a doctree as read from a page with ``methods`` methods.
+
+    That is the structure the rest_method directive leaves for
+    resolve_rest_references to transform.
+    """
+    document = utils.new_document('<benchmark>')
+    for idx in range(methods):
+        section = nodes.section(ids=[f'method-{idx}'])
+        section += nodes.title(text=f'Method {idx}')
+        control = nodes.section(
+            ids=[f'method-{idx}-control'], classes=['detail-control']
+        )
+        node = os_api_ref.rest_method()
+        node['target'] = f'method-{idx}'
+        control += node
+        section += control
+        section += nodes.paragraph(text='The description of the method.')
+        document += section
+    return document
+
+
+STATUS_FILE = """\
+200:
+  default: |
+    Request was successful.
+202:
+  default: |
+    Request is accepted, but processing may take some time.
+400:
+  default: |
+    Some content in the request was invalid.
+401:
+  default: |
+    User must authenticate before making a request.
+403:
+  default: |
+    Policy does not allow current user to do this operation.
+404:
+  default: |
+    The requested resource could not be found.
+409:
+  default: |
+    This operation conflicted with another operation on this resource.
+"""
+
+CONF_FILE = """\
+extensions = ['os_api_ref']
+master_doc = 'index'
+os_api_ref_min_microversion = '2.1'
+os_api_ref_max_microversion = '2.{versions}'
+"""
+
+
+def generate_page(first, methods, params, entries, versions):
+    """Return the text of a page with ``methods`` methods.
+
+    Every method has a request and a response table of ``params``
+    parameters, picked from a parameters file with ``entries`` keys,
+    and tables of success and error codes.
+    """
+    lines = ['.. rest_expand_all::', '']
+    for idx in range(first, first + methods):
+        title = f'Show Resource {idx}'
+        picked = sorted(
+            (idx * 7 + step * 13) % entries for step in range(params)
+        )
+        stanza = [f'   - param_{p:06d}: param_{p:06d}' for p in picked]
+        lines.extend(
+            [
+                '=' * len(title),
+                title,
+                '=' * len(title),
+                '',
+                f'.. rest_method:: GET /v2/resources_{idx}',
+                f'   min_version: 2.{idx % versions + 1}',
+                '',
+                f'Shows the details of resource {idx}.',
+                '',
+                '.. rest_status_code:: success status.yaml',
+                '',
+                '   - 200',
+                '',
+                '.. rest_status_code:: error status.yaml',
+                '',
+                '   - 400',
+                '   - 401',
+                '   - 403',
+                '   - 404',
+                '',
+                'Request',
+                '-------',
+                '',
+                '.. rest_parameters:: parameters.yaml',
+                '',
+                *stanza,
+                '',
+                'Response',
+                '--------',
+                '',
+                '.. rest_parameters:: parameters.yaml',
+                '',
+                *stanza,
+                '',
+            ]
+        )
+    return '\n'.join(lines)
+
+
+def generate_site(srcdir, methods, params, entries, versions, pages):
+    """Write a complete api-ref source tree in srcdir."""
+    srcdir = pathlib.Path(srcdir)
+    (srcdir / 'conf.py').write_text(CONF_FILE.format(versions=versions))
+    (srcdir / 'status.yaml').write_text(STATUS_FILE)
+    (srcdir / 'parameters.yaml').write_text(
+        generate_parameters(entries, versions)
+    )
+    index = ['API Reference', '=============', '', '.. toctree::', '']
+    per_page = -(-methods // pages)
+    for page in range(pages):
+        first = page * per_page
+        count = min(per_page, methods - first)
+        if count <= 0:
+            break
+        index.append(f'   page_{page:03d}')
+        (srcdir / f'page_{page:03d}.rst').write_text(
+            generate_page(first, count, params, entries, versions)
+        )
+    (srcdir / 'index.rst').write_text('\n'.join(index) + '\n')
+
+
+class PhaseTimer:
+    """Cumulative time and calls of the parts of a build."""
+
+    def __init__(self):
+        self.times = collections.defaultdict(float)
+        self.calls = collections.Counter()
+        self.marks = {}
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[name] += time.perf_counter() - start
+                self.calls[name] += 1
+
+        return timed
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+
+
+@contextlib.contextmanager
+def patched(obj, attr, value):
+    old = getattr(obj, attr)
+    setattr(obj, attr, value)
+    try:
+        yield
+    finally:
+        setattr(obj, attr, old)
+
+
+def timed_build(srcdir, timer):
+    """Build srcdir in html, recording the phases in timer."""
+    directives = {
+        'rest_method': os_api_ref.RestMethodDirective,
+        'rest_parameters': os_api_ref.RestParametersDirective,
+        'rest_status_code': http_codes.HTTPResponseCodeDirective,
+    }
+    with contextlib.ExitStack() as stack:
+        for name, directive in directives.items():
+            stack.enter_context(
+                patched(directive, 'run', timer.wrap(name, directive.run))
+            )
+        # setup() connects the function found in the module when the
+        # application is created.
+        stack.enter_context(
+            patched(
+                os_api_ref,
+                'resolve_rest_references',
+                timer.wrap(
+                    'resolve_rest_references',
+                    os_api_ref.resolve_rest_references,
+                ),
+            )
+        )
+        app = SphinxTestApp('html', srcdir=pathlib.Path(srcdir), freshenv=True)
+        try:
+            app.connect(
+                'env-before-read-docs', lambda *a: timer.mark('read_start')
+            )
+            app.connect('env-updated', lambda *a: timer.mark('read_end'))
+            app.connect('build-finished', lambda *a: timer.mark('write_end'))
+            start = time.perf_counter()
+            app.build()
+            total = time.perf_counter() - start
+            warnings = app._warning.getvalue().count('WARNING')
+        finally:
+            app.cleanup()
+    return total, warnings
+
+
+def bench_build(args):
+    runs = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            srcdir = os.path.join(tmpdir, 'source')
+            os.mkdir(srcdir)
+            generate_site(
+                srcdir,
+                args.methods,
+                args.params,
+                args.entries,
+                args.versions,
+                args.pages,
+            )
+            timer = PhaseTimer()
+            total, warnings = timed_build(srcdir, timer)
+        phases = {
+            'read': timer.marks['read_end'] - timer.marks['read_start'],
+            'write': timer.marks['write_end'] - timer.marks['read_end'],
+            'total': total,
+        }
+        phases.update(timer.times)
+        runs.append((phases, dict(timer.calls), warnings))
+
+    # The best run of every phase, as for the other benchmarks.
+    phases = {name: min(run[0][name] for run in runs) for name in runs[0][0]}
+    calls, warnings = runs[0][1], runs[0][2]
+    result = {
+        'parameters': {
+            'methods': args.methods,
+            'params': args.params,
+            'entries': args.entries,
+            'versions': args.versions,
+            'pages': args.pages,
+            'repeat': args.repeat,
+        },
+        'versions': {
+            'python': platform.python_version(),
+            'sphinx': sphinx.__display_version__,
+        },
+        'phases': phases,
+        'calls': calls,
+        'warnings': warnings,
+    }
+
+    print('phase                        time     calls')
+    for name, value in phases.items():
+        print(f'{name:25s}  {value:8.3f}s  {calls.get(name, ""):>6}')
+    if warnings:
+        print(f'warnings: {warnings}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def bench_yaml(args):
+    content = generate_parameters(args.entries)
+
+    # The same constructors, on top of the pure python parser.
+    pure_loader = type(
+        'PureOrderedLoader',
+        (yaml.SafeLoader,),
+        {'yaml_constructors': os_api_ref.OrderedLoader.yaml_constructors},
+    )
+
+    def pure():
+        return yaml.load(content, pure_loader)
+
+    def ordered():
+        return os_api_ref.ordered_load(content)
+
+    assert pure() == ordered(), 'loaders disagree'
+
+    pure_time = min(timeit.repeat(pure, number=1, repeat=args.repeat))
+    ordered_time = min(timeit.repeat(ordered, number=1, repeat=args.repeat))
+    print(f'entries:       {args.entries}')
+    print(f'loader base:   {os_api_ref.OrderedLoader.__mro__[1].__name__}')
+    print(f'pure python:   {pure_time:.3f}s')
+    print(f'ordered_load:  {ordered_time:.3f}s')
+    print(f'speedup:       {pure_time / ordered_time:.1f}x')
+
+
+def bench_resolve(args):
+    print('methods    time      per method')
+    for methods in args.methods:
+        times = []
+        for _ in range(args.repeat):
+            doctree = generate_method_doctree(methods)
+            start = time.perf_counter()
+            os_api_ref.resolve_rest_references(None, doctree)
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        print(f'{methods:7d}  {best:.4f}s  {best / methods * 1e6:.1f}us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    yaml_parser = subparsers.add_parser(
+        'yaml', help='parse time of a large parameters file'
+    )
+    yaml_parser.add_argument('--entries', type=int, default=10000)
+    yaml_parser.add_argument('--repeat', type=int, default=3)
+    yaml_parser.set_defaults(func=bench_yaml)
+
+    resolve_parser = subparsers.add_parser(
+        'resolve', help='resolve_rest_references on pages of many methods'
+    )
+    resolve_parser.add_argument(
+        '--methods', type=int, nargs='+', default=[250, 500, 1000, 2000]
+    )
+    resolve_parser.add_argument('--repeat', type=int, default=3)
+    resolve_parser.set_defaults(func=bench_resolve)
+
+    build_parser = subparsers.add_parser(
+        'build', help='html build of a generated api-ref, by phase'
+    )
+    build_parser.add_argument('--methods', type=int, default=200)
+    build_parser.add_argument(
+        '--params', type=int, default=10, help='parameters per table'
+    )
+    build_parser.add_argument(
+        '--entries',
+        type=int,
+        default=1000,
+        help='entries of the parameters file',
+    )
+    build_parser.add_argument(
+        '--versions', type=int, default=30, help='number of microversions'
+    )
+    build_parser.add_argument('--pages', type=int, default=1)
+    build_parser.add_argument('--repeat', type=int, default=1)
+    build_parser.add_argument(
+        '--json', metavar='FILE', help='also write the results to FILE'
+    )
+    build_parser.set_defaults(func=bench_build)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()